@@ -1,9 +1,637 @@
 #!/usr/bin/env python3
-import re, os, sys, ast, glob, json, time, zlib, fnmatch, subprocess, threading, webbrowser, pickle, shutil
+import time
+startup_marks = [("start", time.perf_counter())]
+# tree_sitter, pickle, webbrowser and concurrent.futures are imported where first used.
+import re, os, sys, ast, stat, glob, heapq, json, mmap, array, codecs, struct, zlib, bisect, collections, fnmatch, itertools, socket, threading, shutil
 import tkinter as tk
 import tkinter.font as tkfont
-try: import tree_sitter
-except: pass
+def startup_mark(name): startup_marks.append((name, time.perf_counter()))
+startup_mark("imports")
+
+class Document:
+    # text kept as blocks of lines so an edit only touches the lines it spans, not the whole buffer.
+    # per block char/byte totals are prefix summed lazily for log(n) row/char/byte conversions.
+    block_size = 256
+    def __init__(self, text=""):
+        self.blocks = [[""]]
+        self.chars = [0]
+        self.nbytes = [0]
+        self.dirty = set()
+        self.rows = self.offsets = None
+        self.version = 0
+        self._text = ""
+        if text: self.splice(0, 0, 0, 0, text)
+
+    @property
+    def text(self):
+        if self._text is None: self._text = "".join(self.lines())
+        return self._text
+
+    def lines(self): return itertools.chain.from_iterable(self.blocks)
+
+    def line_count(self):
+        if self.rows is None: self.rows = list(itertools.accumulate(map(len, self.blocks)))
+        return self.rows[-1]
+
+    def locate(self, row):
+        row = max(0, min(row, self.line_count()-1))
+        block = bisect.bisect_right(self.rows, row)
+        return block, row-(self.rows[block-1] if block else 0)
+
+    def line_range(self, start, end):
+        block, i = self.locate(start)
+        lines = []
+        while block < len(self.blocks) and len(lines) < end-start:
+            lines.extend(self.blocks[block][i:i+end-start-len(lines)])
+            block += 1; i = 0
+        return lines
+
+    def line(self, row):
+        block, i = self.locate(row)
+        return self.blocks[block][i]
+
+    def clamp(self, row, col):
+        if row >= self.line_count(): row = self.line_count()-1; col = sys.maxsize
+        line = self.line(row)
+        return max(row, 0), max(0, min(col, len(line)-line.endswith("\n")))
+
+    def splice(self, row1, col1, row2, col2, text=""):
+        (row1, col1), (row2, col2) = self.clamp(row1, col1), self.clamp(row2, col2)
+        if (row2, col2) < (row1, col1): row2, col2 = row1, col1
+        b1, i1 = self.locate(row1)
+        b2, i2 = self.locate(row2)
+        is_last = b2 == len(self.blocks)-1 and i2 == len(self.blocks[b2])-1
+        parts = (self.blocks[b1][i1][:col1] + text + self.blocks[b2][i2][col2:]).split("\n")
+        lines = [p+"\n" for p in parts[:-1]]
+        if is_last: lines.append(parts[-1])
+        merged = self.blocks[b1][:i1] + lines + self.blocks[b2][i2+1:]
+        if len(merged) > self.block_size*2: merged = [merged[i:i+self.block_size] for i in range(0, len(merged), self.block_size)]
+        else: merged = [merged]
+        if len(lines) != row2-row1+1 or len(merged) != 1 or b1 != b2: self.rows = None
+        if len(merged) != b2-b1+1: self.dirty = {d if d < b1 else d+len(merged)-(b2-b1+1) for d in self.dirty if not b1 <= d <= b2}
+        self.blocks[b1:b2+1] = merged
+        self.chars[b1:b2+1] = self.nbytes[b1:b2+1] = [0]*len(merged)
+        self.dirty.update(range(b1, b1+len(merged)))
+        self.offsets = self._text = None
+        self.version += 1
+
+    def prefix(self):
+        if self.offsets is None:
+            for block in self.dirty:
+                text = "".join(self.blocks[block])
+                self.chars[block], self.nbytes[block] = len(text), len(text.encode())
+            self.dirty.clear()
+            self.offsets = list(itertools.accumulate(self.chars)), list(itertools.accumulate(self.nbytes))
+        return self.offsets
+
+    def offset(self, row, col):
+        row, col = self.clamp(row, col)
+        block, i = self.locate(row)
+        chars, nbytes = self.prefix()
+        head = "".join(self.blocks[block][:i]) + self.blocks[block][i][:col]
+        return (chars[block-1] if block else 0)+len(head), (nbytes[block-1] if block else 0)+len(head.encode())
+
+    def position(self, offset, use_bytes=False):
+        self.line_count()
+        sums = self.prefix()[use_bytes]
+        block = min(bisect.bisect_right(sums, offset), len(self.blocks)-1)
+        offset -= sums[block-1] if block else 0
+        lines = self.blocks[block]
+        for i, line in enumerate(lines):
+            size = len(line.encode()) if use_bytes else len(line)
+            if offset < size or i == len(lines)-1: break
+            offset -= size
+        if use_bytes and not line.isascii(): offset = len(line.encode()[:offset].decode(errors="ignore"))
+        return (self.rows[block-1] if block else 0)+i, min(offset, len(line)-line.endswith("\n"))
+
+    def index(self, offset, use_bytes=False):
+        row, col = self.position(offset, use_bytes)
+        return f"{row+1}.{col}"
+
+    def point(self, row, col):
+        line = self.line(row)
+        return row, col if line.isascii() else len(line[:col].encode())
+
+    def char_col(self, row, byte_col):
+        line = self.line(row)
+        return byte_col if line.isascii() else len(line.encode()[:byte_col].decode(errors="ignore"))
+
+    def tree_edit(self, row1, col1, row2, col2, text=""):
+        (row1, col1), (row2, col2) = self.clamp(row1, col1), self.clamp(row2, col2)
+        if (row2, col2) < (row1, col1): row2, col2 = row1, col1
+        start, end = self.offset(row1, col1)[1], self.offset(row2, col2)[1]
+        start_point, data = self.point(row1, col1), text.encode()
+        if b"\n" in data: end_point = (row1+data.count(b"\n"), len(data)-data.rfind(b"\n")-1)
+        else: end_point = (row1, start_point[1]+len(data))
+        return start, end, start+len(data), start_point, self.point(row2, col2), end_point
+
+    def reader(self):
+        nbytes = self.prefix()[1]
+        def read(byte, point=None):
+            block = bisect.bisect_right(nbytes, byte)
+            if block >= len(self.blocks): return b""
+            return "".join(self.blocks[block]).encode()[byte-(nbytes[block-1] if block else 0):]
+        return read
+
+
+class TagQueue:
+    # tag work as [op, tag, flat index list, position], applied as multi-range "tag add/remove" calls.
+    batch = 512
+    def __init__(self): self.work = collections.deque()
+    def __len__(self): return len(self.work)
+    def clear(self): self.work.clear()
+
+    def push(self, ops, front=False):
+        if front: self.work.extendleft(reversed(ops))
+        else: self.work.extend(ops)
+
+    def step(self, widget):
+        op, tag, indices, pos = item = self.work[0]
+        if op == "done":
+            widget.tagged = spans_add(widget.tagged, *indices)
+            widget.pending = spans_remove(widget.pending, *indices)
+            return self.work.popleft()
+        end = pos+self.batch*2
+        widget.tk.call(widget._orig, "tag", op, tag, *indices[pos:end])
+        if end < len(indices): item[3] = end
+        else: self.work.popleft()
+
+
+class Highlighter:
+    # one worker per editor, started on demand and left to exit once idle.
+    idle_timeout = 5
+    def __init__(self, widget):
+        self.widget = widget
+        self.cond = threading.Condition()
+        self.results = collections.deque()
+        self.job = self.thread = None
+        self.busy = False
+
+    def request(self, region, visible, tag_names, version):
+        with self.cond:
+            self.busy = True
+            self.job = (region, visible, tag_names, version)
+            if not self.thread or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="highlighter", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                if not self.job and not self.cond.wait_for(lambda: self.job, self.idle_timeout): self.thread = None; return
+                (region, visible, tag_names, version), self.job = self.job, None
+            ops = None
+            try:
+                if self.widget.version == version: ops = highlight_region(self.widget, tag_names, region, version)
+            except Exception as e:
+                print(self.widget.path+" highlight error: "+str(e), file=sys.__stdout__)
+                ops = [["done", None, region, 0]]
+            if ops != None: self.results.append((version, region, visible, ops))
+            self.busy = False
+
+
+class TrigramIndex:
+    # lowercased byte trigram -> ids of the files containing it, ids are never reused so stale entries just go dead.
+    max_size = 1 << 22
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.files = {}
+        self.paths = []
+        self.postings = {}
+        self.loaded = self.dirty = False
+        self.dead = 0
+
+    def load(self):
+        with self.lock:
+            if self.loaded: return
+            self.loaded = True
+            import pickle
+            try: self.files, self.paths, self.postings = pickle.load(open(self.path, "rb"))
+            except Exception: pass
+            self.dead = len(self.paths)-len(self.files)
+
+    def stale(self, path, mtime): return self.files.get(path, (0, None))[1] != mtime
+
+    def update(self, path, mtime, grams):
+        with self.lock:
+            if path in self.files: self.paths[self.files[path][0]] = None; self.dead += 1
+            id = len(self.paths)
+            self.paths.append(path)
+            self.files[path] = (id, mtime)
+            for gram in grams:
+                if gram in self.postings: self.postings[gram].append(id)
+                else: self.postings[gram] = array.array("I", (id,))
+            self.dirty = True
+
+    def candidates(self, grams):
+        if not grams: return None
+        with self.lock:
+            ids = None
+            for gram in sorted(grams, key=lambda x: len(self.postings.get(x, ()))):
+                ids = set(self.postings.get(gram, ())) if ids == None else ids.intersection(self.postings.get(gram, ()))
+                if not ids: break
+            return {self.paths[i] for i in ids if self.paths[i]}
+
+    def save(self):
+        # deleted files go dead too, compaction then renumbers the live ones so paths and postings shrink.
+        missing = [path for path in list(self.files) if not os.path.exists(path)]
+        with self.lock:
+            for path in missing:
+                if path in self.files: self.paths[self.files.pop(path)[0]] = None; self.dead += 1; self.dirty = True
+            if not self.dirty: return
+            if self.dead > len(self.files):
+                ids = {v[0]:i for i, v in enumerate(self.files.values())}
+                self.paths = list(self.files)
+                self.files = {k:(ids[v[0]], v[1]) for k,v in self.files.items()}
+                self.postings = {k:a for k,v in self.postings.items() if (a := array.array("I", (ids[i] for i in v if i in ids)))}
+                self.dead = 0
+            import pickle
+            data = pickle.dumps((self.files, self.paths, self.postings))
+            self.dirty = False
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f: f.write(data)
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+
+
+class FileWatcher:
+    # inotify on the watched files' directories where available, otherwise stat polling at an adaptive interval.
+    min_interval, max_interval, batch = 100, 2000, 256
+    mask = 0x2 | 0x4 | 0x8 | 0x80 | 0x100 | 0x200 # modify, attrib, close_write, moved_to, create, delete
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.paths = {}
+        self.dirs = {}
+        self.polled = set()
+        self.changed = set()
+        self.fd = None
+        self.interval = self.min_interval
+        self.cursor = 0
+        try:
+            import ctypes, ctypes.util
+            self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd >= 0: self.fd = fd
+        except Exception: pass
+
+    def add(self, path, mtime=None):
+        path = os.path.abspath(path).replace("\\", "/")
+        dir = os.path.dirname(path)
+        with self.lock:
+            if path in self.paths: return
+            if mtime != None: self.paths[path] = mtime
+            else:
+                try: self.paths[path] = os.path.getmtime(path)
+                except OSError: self.paths[path] = 0
+            if self.fd != None and not dir in self.dirs and not dir in self.polled:
+                # past fs.inotify.max_user_watches (or on a filesystem without inotify) the dir's files are stat polled.
+                wd = self.libc.inotify_add_watch(self.fd, dir.encode(), self.mask)
+                if wd >= 0: self.dirs[dir] = wd; self.dirs[wd] = dir
+                else: self.polled.add(dir)
+
+    def remove(self, path):
+        path = os.path.abspath(path).replace("\\", "/")
+        with self.lock: self.paths.pop(path, None)
+
+    def read(self):
+        try: data = os.read(self.fd, 1 << 16)
+        except BlockingIOError: return
+        pos = 0
+        with self.lock:
+            while pos < len(data):
+                wd, mask, cookie, size = struct.unpack_from("iIII", data, pos)
+                name = data[pos+16:pos+16+size].rstrip(b"\0").decode(errors="replace")
+                pos += 16+size
+                if mask & 0x4000: self.changed.update(self.paths) # queue overflow, events were lost so everything is rechecked.
+                elif wd in self.dirs and (path := "/".join((self.dirs[wd], name))) in self.paths: self.changed.add(path)
+
+    def poll(self, always=()):
+        with self.lock:
+            check = set(self.changed)
+            if self.fd == None or self.polled:
+                paths = list(self.paths) if self.fd == None else [p for p in self.paths if os.path.dirname(p) in self.polled]
+                check.update(always, paths[self.cursor:self.cursor+self.batch])
+                self.cursor = self.cursor+self.batch if self.cursor+self.batch < len(paths) else 0
+            changed, self.changed = [], set()
+            for path in check:
+                if not path in self.paths: continue
+                try: mtime = os.path.getmtime(path)
+                except OSError: mtime = 0
+                if mtime != self.paths[path]: self.paths[path] = mtime; changed.append(path)
+            if self.fd == None or self.polled: self.interval = self.min_interval if changed else min(self.interval*2, self.max_interval)
+            return changed
+
+    def close(self):
+        with self.lock:
+            if self.fd == None: return
+            for wd in [k for k in self.dirs if isinstance(k, int)]: self.libc.inotify_rm_watch(self.fd, wd)
+            os.close(self.fd)
+            self.fd = None; self.dirs = {}
+
+
+class Executor:
+    # long lived thread and process pools shared by open, find all and cache.
+    # completions queue up here and run on the Tk thread when watch_file calls dispatch().
+    def __init__(self, workers=32):
+        self.workers = workers
+        self.threads = self.processes = None
+        self.lock = threading.Lock()
+        self.active = 0
+        self.done = collections.deque()
+
+    def fork(self):
+        # forks the worker helper now, while this is the only thread. no pool is made until find all first needs one.
+        if os.name == "nt" or not hasattr(socket, "send_fds") or threading.active_count() > 1: return
+        control, helper = socket.socketpair()
+        if os.fork() == 0:
+            control.close()
+            workers_helper(helper)
+        helper.close()
+        self.processes = Workers(control, os.cpu_count() or 1)
+
+    def pool(self, process=False):
+        import concurrent.futures
+        with self.lock:
+            if self.threads == None: self.threads = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="executor")
+        return self.processes if process and self.processes != None else self.threads
+
+    def submit(self, fn, *args, done=None, process=False):
+        with self.lock: self.active += 1
+        future = self.pool(process).submit(fn, *args)
+        future.add_done_callback(lambda f: self.complete(f, done))
+        if is_main_thread(): wake()
+        return future
+
+    def complete(self, future, done):
+        if done and not future.cancelled(): self.done.append((done, future))
+        elif not future.cancelled() and future.exception(): print(f"error: {future.exception()!r}", file=sys.stderr, flush=True)
+        with self.lock: self.active -= 1
+
+    def map(self, fn, items, done=None, finished=None, process=False):
+        # small chunks on the pool's shared queue, so idle workers keep pulling work instead of waiting on a fixed split.
+        size = max(1, min(256, len(items)//(self.workers*4)))
+        chunks = [items[i:i+size] for i in range(0, len(items), size)]
+        remaining = len(chunks)
+        def chunk_done(result):
+            nonlocal remaining
+            if done and result is not None: done(result)
+            remaining -= 1
+            if not remaining and finished: finished()
+        if not chunks and finished:
+            self.done.append((lambda _: finished(), None))
+            if is_main_thread(): wake()
+        return [self.submit(fn, chunk, done=chunk_done, process=process) for chunk in chunks]
+
+    def dispatch(self, budget=0.01):
+        start = time.time()
+        while self.done and time.time()-start < budget:
+            done, future = self.done.popleft()
+            try:
+                if future and future.exception(): print(f"error: {future.exception()}", file=sys.stderr); result = None
+                else: result = future.result() if future else None
+                done(result)
+            except Exception as e: print(e, file=sys.stderr)
+
+    def busy(self): return self.active > 0 or bool(self.done)
+
+
+class Workers:
+    # worker processes forked on demand by a helper that was forked before Tk or any other thread started,
+    # so a worker never inherits a lock some thread was holding. a worker that dies is replaced by the next call.
+    def __init__(self, helper, count):
+        self.helper = helper
+        self.count = count
+        self.lock = threading.Lock()
+        self.idle = []
+        self.threads = None
+
+    def submit(self, fn, *args):
+        import concurrent.futures
+        with self.lock:
+            if self.threads == None: self.threads = concurrent.futures.ThreadPoolExecutor(max_workers=self.count, thread_name_prefix="worker")
+        return self.threads.submit(self.call, fn, *args)
+
+    def call(self, fn, *args):
+        with self.lock: conn = self.idle.pop() if self.idle else None
+        if conn == None:
+            conn, child = socket.socketpair()
+            try:
+                with self.lock: socket.send_fds(self.helper, [b"w"], [child.fileno()])
+            finally: child.close()
+        try: message_send(conn, (fn.__name__, args)); ok, result = message_recv(conn)
+        except (OSError, EOFError): conn.close(); raise ChildProcessError(f"worker process died running {fn.__name__}")
+        with self.lock: self.idle.append(conn)
+        if not ok: raise result
+        return result
+
+
+def message_send(conn, obj):
+    import pickle
+    data = pickle.dumps(obj)
+    conn.sendall(struct.pack("Q", len(data))+data)
+
+
+def message_recv(conn):
+    import pickle
+    data, size = b"", 8
+    while len(data) < size:
+        if not (chunk := conn.recv(min(size-len(data), 1 << 20))): raise EOFError
+        data += chunk
+        if size == 8 and len(data) == 8: size += struct.unpack("Q", data)[0]
+    return pickle.loads(data[8:])
+
+
+def workers_helper(sock):
+    # runs in the forked helper until the editor closes its end: each request carries a socket for a new worker.
+    try:
+        import signal
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        while True:
+            _, fds, *_ = socket.recv_fds(sock, 1, 1)
+            if not fds: break
+            if os.fork() == 0: sock.close(); worker_serve(socket.socket(fileno=fds[0]))
+            os.close(fds[0])
+    finally: os._exit(0)
+
+
+def worker_serve(conn):
+    try:
+        while True:
+            try: name, args = message_recv(conn)
+            except (OSError, EOFError): break
+            try: reply = (True, globals()[name](*args))
+            except Exception as e: reply = (False, e)
+            try: message_send(conn, reply)
+            except Exception as e: message_send(conn, (False, RuntimeError(repr(e))))
+    finally: os._exit(0)
+
+
+class DirIndex:
+    # directory listings cached per directory and revalidated against the directory's mtime,
+    # so completion and glob expansion cost one stat per directory instead of a listdir and an isdir per entry.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dirs = {}
+
+    def listing(self, dir):
+        key = os.path.abspath(dir or os.curdir)
+        try: mtime = os.stat(key).st_mtime
+        except OSError: return ()
+        with self.lock: cached = self.dirs.get(key)
+        if cached and cached[0] == mtime: return cached[1]
+        try:
+            with os.scandir(key) as it: entries = tuple(sorted((e.name, e.is_dir()) for e in it))
+        except OSError: entries = ()
+        with self.lock: self.dirs[key] = (mtime, entries)
+        return entries
+
+    def warm(self, dir, limit):
+        queue = collections.deque([dir])
+        while queue and limit > 0:
+            dir = queue.popleft()
+            for name, is_dir in self.listing(dir):
+                limit -= 1
+                if is_dir and not name.startswith("."): queue.append(os.path.join(dir, name))
+
+    def glob(self, pattern):
+        pattern = os.path.expanduser(pattern)
+        dir, *parts = pattern.replace("\\", "/").split("/")
+        if not parts: return self.glob_parts("", [dir])
+        if glob.has_magic(dir): return self.glob_parts("", [dir]+parts)
+        return self.glob_parts(dir+"/" if dir == "" or dir.endswith(":") else dir, parts)
+
+    def glob_parts(self, dir, parts):
+        part, rest = parts[0], parts[1:]
+        if part == "**":
+            if rest: yield from self.glob_parts(dir, rest)
+            for name, is_dir in self.listing(dir):
+                if name.startswith("."): continue
+                path = os.path.join(dir, name)
+                if not rest: yield path
+                if is_dir: yield from self.glob_parts(path, parts)
+        elif not glob.has_magic(part):
+            if not rest: 
+                if part == "" or any(name == part for name, _ in self.listing(dir)): yield os.path.join(dir, part)
+            else: yield from self.glob_parts(os.path.join(dir, part), rest)
+        else:
+            for name, is_dir in self.listing(dir):
+                if name.startswith(".") and not part.startswith("."): continue
+                if not fnmatch.fnmatch(name, part): continue
+                if not rest: yield os.path.join(dir, name)
+                elif is_dir: yield from self.glob_parts(os.path.join(dir, name), rest)
+
+
+class FuzzyMatcher:
+    # fzf style subsequence ranking. a query that extends the previous one only rescans the previous survivors.
+    chunk = 8192
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.candidates = self.query = None
+        self.survivors = []
+
+    def pattern(self, query):
+        flags = 0 if any(c.isupper() for c in query) else re.IGNORECASE
+        return re.compile(".*?".join(f"({re.escape(c)})" for c in query), flags)
+
+    def score(self, match, candidate, offset, base):
+        # boundary and camel case bonuses carry along a consecutive run, gaps cost per skipped char.
+        score, prev, bonus = 8 if match.start(1) >= base else 0, -2, 0
+        for i in range(1, match.re.groups+1):
+            pos = match.start(i)
+            if pos == prev+1: bonus = max(bonus, 4)
+            else:
+                if prev >= 0: score -= 2+min(pos-prev-1, 8)
+                if pos == offset or candidate[pos-1] in "/\\_-. ": bonus = 10
+                elif candidate[pos-1].islower() and candidate[pos].isupper(): bonus = 8
+                else: bonus = 0
+            score += 16+bonus
+            prev = pos
+        return score
+
+    def rank(self, pattern, candidate, offset):
+        base = max(candidate.rfind("/"), candidate.rfind("\\"), offset-1)+1
+        match = pattern.search(candidate, offset)
+        score = self.score(match, candidate, offset, base)
+        if base > match.start(1) and (tail := pattern.search(candidate, base)): score = max(score, self.score(tail, candidate, offset, base))
+        return score, -len(candidate)
+
+    def match(self, query, candidates, limit=1000, offset=0, cancelled=lambda: False):
+        if not query: return candidates[:limit]
+        with self.lock:
+            if cancelled(): return None
+            narrow = self.query and query.startswith(self.query) and (candidates is self.candidates or candidates == self.candidates)
+            pool = self.survivors if narrow else candidates
+            pattern = self.pattern(query)
+            survivors = []
+            for i in range(0, len(pool), self.chunk):
+                if cancelled(): return None
+                survivors += [c for c in pool[i:i+self.chunk] if pattern.search(c, offset)]
+            self.candidates, self.query, self.survivors = candidates, query, survivors
+        scored = []
+        for i in range(0, len(survivors), self.chunk):
+            if cancelled(): return None
+            scored += [(self.rank(pattern, c, offset), c) for c in survivors[i:i+self.chunk]]
+        return [c for _, c in heapq.nlargest(limit, scored, key=lambda x: x[0])]
+
+
+class LargeFile:
+    # read only view of a memory mapped file. line starts are indexed in the background and
+    # the widget only ever holds a window of lines around the view.
+    window, chunk = 2000, 1 << 22
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f: self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self.data)
+        self.lines = array.array("Q", [0])
+        self.indexed = self.start = 0
+        self.lock = threading.Lock()
+        self.index_to(1 << 20)
+        executor.submit(self.index_to, self.size)
+
+    def index_to(self, limit):
+        # goto and find index on demand while the background pass runs, the lock keeps each chunk extended once.
+        limit = min(limit, self.size)
+        while self.indexed < limit:
+            with self.lock:
+                pos = self.indexed
+                if pos >= limit: break
+                block = self.data[pos:min(pos+self.chunk, limit)]
+                self.lines.extend(m.end()+pos for m in re.finditer(b"\n", block))
+                self.indexed = pos+len(block)
+
+    def index_line(self, line):
+        while len(self.lines) <= line+1 and not self.done(): self.index_to(self.indexed+self.chunk)
+
+    def done(self): return self.indexed >= self.size
+
+    def line_count(self): return len(self.lines) if self.done() and self.lines[-1] != self.size else len(self.lines)-1 or 1
+
+    def line_of(self, offset): return bisect.bisect_right(self.lines, offset)-1
+
+    def text(self, start, count):
+        lines = self.lines
+        begin = lines[min(start, len(lines)-1)]
+        end = lines[start+count] if start+count < len(lines) else self.size if self.done() else lines[-1]
+        return self.data[begin:end].decode(errors="replace").replace("\r\n", "\n")
+
+    def find(self, text, pos, backwards=False):
+        pat = re.compile(re.escape(text.encode()), re.IGNORECASE)
+        if not backwards:
+            match = pat.search(self.data, pos) or pat.search(self.data, 0, pos)
+            return match.start() if match else None
+        for end, stop in ((pos, 0), (self.size, pos)):
+            while end > stop:
+                begin = max(stop, end-self.chunk)
+                found = [m.start() for m in pat.finditer(self.data, begin, min(end+len(text.encode())-1, self.size)) if m.start() < end]
+                if found: return found[-1]
+                end = begin
+        return None
+
 
 class EventText(tk.Text):
     event_args = None
@@ -13,14 +641,17 @@ class EventText(tk.Text):
     edits = extern_edits = read_only = False
     mtime = tag_line = lines = 0
     cursor_label = None
-    text = highlights = language = parser = tree = changes = None
+    highlights = language = parser = tree = tagged = pending = doc = highlighter = None
+    version = edit_time = 0
+    tail = large = loading = None
     lock = None
     def __init__(self, *args, **kwargs):
         tk.Text.__init__(self, *args, **kwargs)
         self._orig = self._w + "_orig"
         self.tk.call("rename", self._w, self._orig)
         self.tk.createcommand(self._w, self._proxy)
-        for k, v in commands.items(): self.bind(v["shortcut"], lambda _, key=k: palette_op(key))
+        for k, v in commands.items():
+            if "shortcut" in v: self.bind(v["shortcut"], lambda _, key=k: palette_op(key))
         self.selection_own()
         def focused():
             global last_complist
@@ -40,36 +671,38 @@ class EventText(tk.Text):
         self.bind("<<TextModified>>", lambda x: editor_modified(self))
         self.bind("<Control-g>", goto_link)
         self.lock = threading.Lock()
-        self.changes = []
-        self.tag_queue = []
-    class Range:
-        start_byte=0
-        end_byte=0
+        self.tagged = []
+        self.pending = []
+        self.tag_queue = TagQueue()
+        self.highlighter = Highlighter(self)
+        self.doc = Document()
+    @property
+    def text(self): return self.doc.text
+    def rowcol(self, index):
+        row, col = map(int, str(self.tk.call(self._orig, "index", index)).split("."))
+        return row-1, col
+    def doc_edit(self, command, args):
+        if str(self.tk.call(self._orig, "cget", "-state")) == tk.DISABLED: return None
+        if command == "insert": return [*self.rowcol(args[0])]*2 + ["".join(args[1::2])]
+        start = self.rowcol(args[0])
+        end = self.rowcol(args[1]) if len(args) > 1 else self.rowcol(f"{args[0]} + 1c")
+        if command == "replace": return [*start, *end, "".join(args[2::2])]
+        if len(args) > 2: return []
+        return [*start, *end, ""]
     def _proxy(self, command, *args):
         cmd = (self._orig, command) + args
         result = ""
         try:
             edits = []
-            fallback = EventText.Range()
+            splice = None
             if command in ("insert", "delete", "replace"):
-                if self.tree != None:
-                    if command == "insert":
-                        start = self.count("1.0", args[0])[0]
-                        amount = len(args[1])
-                        edits = [start, start, start+amount, (start, start), (start, start), (start, start+amount)]
-                    elif command == "delete":
-                        start = self.count("1.0", args[0])[0]
-                        if len(args) > 1: amount = self.count("1.0", args[1])[0] - start
-                        else: amount = 1
-                        edits = [start, start+amount, start, (start, start), (start, start+amount), (start, start)]
-                    if command in ["insert", "delete"]:
-                        fallback.start_byte = self.count("1.0", f"{args[0]}")[0]
-                        fallback.end_byte = fallback.start_byte
+                splice = self.doc_edit(command, args)
             result = self.tk.call(cmd)
+            if command in ("insert", "delete", "replace", "yview", "see"): wake()
             if command == "configure" and self.cursor_label: self.cursor_label.destroy(); self.cursor_label = None
             if self.read_only and " ".join((command, *args)).startswith("mark set insert"):
                 if self.cursor_label == None:
-                    self.cursor_label = tk.Frame(root, height=self.text_config["font"][1]*2, width=2)
+                    self.cursor_label = tk.Frame(self.master, height=self.text_config["font"][1]*2, width=2)
                 if bbox :=self.bbox(tk.INSERT):
                     x1, y1 = bbox[:2]
                     self.cursor_label.place(x=x1, y=y1)
@@ -77,14 +710,29 @@ class EventText(tk.Text):
 
             if debug_output: print(cmd)
             if command in ("insert", "delete", "replace"):
-                self.text = self.get("1.0", "end - 1c")
-                if edits:
-                    self.tree.edit(*edits)
-                    new_tree = self.parser.parse(self.text.encode(), self.tree)
-                    changes = self.tree.get_changed_ranges(new_tree)
-                    if not changes: changes.append(fallback)
-                    self.changes.extend(changes)
-                    self.tree = new_tree
+                if splice != None:
+                    self.version += 1
+                    self.edit_time = time.time()
+                    if self.pending: self.pending = []; self.tag_queue.clear()
+                with self.lock:
+                    if splice:
+                        if self.tree != None: edits = self.doc.tree_edit(*splice)
+                        rows = self.doc.line_count()
+                        self.doc.splice(*splice)
+                        delta = self.doc.line_count()-rows
+                        if delta: self.tagged = spans_shift(self.tagged, splice[0], delta)
+                        self.tagged = spans_remove(self.tagged, splice[0], splice[0]+max(delta, 0)+1)
+                    elif splice != None:
+                        self.doc = Document(self.get("1.0", "end - 1c"))
+                        self.tagged = []
+                        if self.tree != None: self.tree = self.parser.parse(self.doc.reader())
+                    if edits:
+                        self.tree.edit(*edits)
+                        new_tree = self.parser.parse(self.doc.reader(), self.tree)
+                        for change in self.tree.get_changed_ranges(new_tree):
+                            start, end = self.doc.position(change.start_byte, True)[0], self.doc.position(change.end_byte, True)[0]
+                            self.tagged = spans_remove(self.tagged, start, end+1)
+                        self.tree = new_tree
                 self.event_args = args
                 self.event_generate("<<TextModified>>")
             # if command in ("yview", "xview"):
@@ -99,7 +747,30 @@ _grampy_icon = zlib.decompress(b'x\x9c\xeb\x0c\xf0s\xe7\xe5\x92\xe2b``\xe0\xf5\x
 _grampy_dir = os.path.expanduser("~/.grampy")
 _grampy_dir = _grampy_dir.replace("\\", "/")
 os.makedirs(_grampy_dir, exist_ok=True)
+server_path = "/".join((_grampy_dir, "server.sock"))
+
+
+def server_forward(args):
+    # hand the request to a running instance, which opens a window in its warm process instead of us starting another.
+    if os.name == "nt" or not hasattr(socket, "AF_UNIX"): return False
+    args = [a if a.startswith("geo=") else os.path.abspath(os.path.expanduser(a)) for a in args]
+    try:
+        with socket.socket(socket.AF_UNIX) as client:
+            client.settimeout(2)
+            client.connect(server_path)
+            client.sendall(json.dumps(args).encode()+b"\n")
+            return client.recv(2) == b"ok"
+    except OSError: return False
+
+
+profile_startup = "--profile-startup" in sys.argv
+if profile_startup: sys.argv.remove("--profile-startup")
+elif server_forward(sys.argv[1:]): sys.exit(0)
+startup_mark("forward")
 conf_path = "/".join((_grampy_dir, "config.json"))
+grammars_path = "/".join((_grampy_dir, "grammars.json"))
+trigram_index = TrigramIndex("/".join((_grampy_dir, "trigrams.idx")))
+sitter_dll = "/".join((_grampy_dir, "treesitter.dll"))
 config = {
     "text": {
         "foreground": "gray72",
@@ -113,6 +784,7 @@ config = {
         "highlightbackground": "gray20"
     },
     "tree-sitter": {"search_path": "~/github/"},
+    "max_widgets": 32,
     "regexs": [r"(?P<brackets>[\[\]\{\}\(\)])"],
     "tags": {
         "links": { "foreground": "skyblue", "underline": True },
@@ -144,63 +816,83 @@ config = {
     }
 }
 
-files = {}
+files = collections.OrderedDict()
 commands = {}
 op_args = {}
-glob_map = {}
+query_cache = {}
+regex_cache = {}
+language_cache = {}
+font_cache = {}
+grammars = None
 short_paths = []
 tab_spaces = 4
+tag_chunk = 2000
+highlight_delay = 0.03
+regex_cache_size = 100000
+find_chunk = 32
+find_window = 64
+find_cap = 10000
+find_generation = 0
+find_feed = collections.deque()
+find_active = False
+saving = {}
+loading = []
+load_head = 1 << 16
 last_complist = ""
+complist_max = 1000
 current_file = ""
 debug_output = False
 is_fullscreen = False
-editor = complist = root = None
+editor = complist = palette = root = top = active = server = wake_id = None
+windows = []
+wake_time = 0
 destroy_list = []
 start_time = time.time_ns()
 match_lock = threading.Lock()
-work_lock = threading.Lock()
 gui_lock = threading.Lock()
 print_lock = threading.Lock()
 file_lock = threading.Lock()
+query_lock = threading.Lock()
+grammar_lock = threading.Lock()
 frame_time = 0
 _sess_dir = "/".join((_grampy_dir, str(start_time)))
 os.makedirs(_sess_dir)
 stdout_path = "/".join((_sess_dir, "output.log"))
-sys.stdout = open(stdout_path, "w")
+find_path = "/".join((_sess_dir, "find_all.log"))
+sys.stdout = open(stdout_path, "w", buffering=1)
 
 if not os.path.exists(conf_path): json.dump(config, open(conf_path, "w"), indent=4)
-conf_mtime = os.path.getmtime(conf_path)
+watcher = FileWatcher()
+executor = Executor()
+dir_index = DirIndex()
+open_matcher = FuzzyMatcher()
+tab_matcher = FuzzyMatcher()
+startup_mark("session")
+watcher.add(conf_path)
 br_pat = re.compile(r"}|{|\.|:|/|\"|\\|\+|\-| |\(|\)|\[|\]")
 
 def is_main_thread(): return threading.current_thread() is threading.main_thread()
 
-def share_work(worker, in_args, log_file=None, max_threads=32):
-    work_lock.acquire()
-    threads = []
-    available_threads = max_threads-(len(threading.enumerate())-1)
-    start = time.time()
-    safe_print(f"starting {worker.__name__} jobs using {available_threads} threads to split {len(in_args)} work items", flush=True, file=log_file)
-    step = int((len(in_args)/available_threads)+.5)
-    while len(in_args) > step and step > 0:
-        args, in_args = in_args[:step], in_args[step:]
-        threads.append(threading.Thread(target=worker, args=([args]), name=worker.__name__))
-    threads.append(threading.Thread(target=worker, args=([in_args]), name=worker.__name__))
-    for t in threads: t.start()
-    while any([t.is_alive() for t in threads]):
-        root.update()
-        time.sleep(0.01)
-    safe_print(f"\ndone. {time.time()-start:.2f} secs", file=log_file)
-    work_lock.release()
-
 def spawn(path):
-    flags = 0
-    if os.name == "nt": flags = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW | subprocess.CREATE_BREAKAWAY_FROM_JOB | subprocess.CREATE_DEFAULT_ERROR_MODE
-    if os.name != "nt": bar_height = (int(root.winfo_geometry().split("+")[-1])-int(root.wm_geometry().split("+")[-1]))-7 # TODO: workout a clean/correct way to do this.
+    if os.name != "nt": bar_height = (int(top.winfo_geometry().split("+")[-1])-int(top.wm_geometry().split("+")[-1]))-7 # TODO: workout a clean/correct way to do this.
     else: bar_height = 0
-    swidth = root.winfo_screenwidth()
-    geo = [root.winfo_x(), root.winfo_y(), root.winfo_width(), root.winfo_height()]
+    swidth = top.winfo_screenwidth()
+    geo = [top.winfo_x(), top.winfo_y(), top.winfo_width(), top.winfo_height()]
     geo[1], geo[0] = geo[1]-bar_height, geo[0]+geo[2] if ((geo[0]+(geo[2]/2))%swidth) < swidth/2 else geo[0]-geo[2]
-    subprocess.Popen([sys.executable, __file__, path, f"geo={geo}"], creationflags=flags)
+    window_open(path, geo)
+
+
+def resolve_font(family):
+    # tkfont.families() lists every installed font, so each configured family is checked once with a single lookup.
+    if not family in font_cache:
+        font_cache[family] = family if tkfont.Font(family=family).actual("family").lower() == family.lower() else "Courier"
+    return font_cache[family]
+
+
+def startup_report():
+    lines = [f"{name:<12}{(t-prev)*1000:8.1f} ms" for (name, t), (_, prev) in zip(startup_marks[1:], startup_marks)]
+    lines.append(f"{'total':<12}{(startup_marks[-1][1]-startup_marks[0][1])*1000:8.1f} ms")
+    for out in (sys.__stdout__, sys.stdout): print("\n".join(["startup profile"]+lines), file=out, flush=True)
 
 
 def apply_config(widget):
@@ -210,7 +902,7 @@ def apply_config(widget):
         text_config = config["text"]
         tags_config = config["tags"]
         font, fontsize = text_config["font"] if "font" in text_config else ""
-        font = font if font in tkfont.families() else "Courier"
+        font = resolve_font(font)
         font = (font, fontsize)
         if not "font" in text_config: text_config["font"] = font
         text_config.update({"font":font, "relief": "flat", "borderwidth":0})
@@ -225,6 +917,7 @@ def apply_config(widget):
         if not "regexs" in config: config["regexs"] = []
         config["regexs"].append(r"\b(?P<links>(file://|https?://)[^\s]*)\b")
         config["regexs"] = [re.compile(r, re.S) for r in config["regexs"]]
+        regex_cache.clear()
     except Exception as e:
         print(e, file=sys.stderr)
 
@@ -234,8 +927,11 @@ def update_title(widget):
     title = widget.name
     if widget.edits: title += "*"
     if widget.read_only: title += "  (read only)"
+    if widget.path in saving: title += "  (saving)"
+    if widget.loading: title += f"  (loading {min(99, 100*widget.loading[2]//max(widget.loading[3], 1))}%)"
+    if widget.large: title += f"  (lines {widget.large.start+1}-{widget.large.start+widget.large.window} of {widget.large.line_count()}{'' if widget.large.done() else '+'})"
     if widget.extern_edits: title = f"!! WARNING !!    External edits to  ' {title} '  close and reopen    !! WARNING !!"
-    root.title(title)
+    top.title(title)
 
 
 def show_stdout(): file_open(stdout_path, read_only=True); root.update()
@@ -254,10 +950,12 @@ def shorten_paths(paths):
 
 
 def list_path(path):
-    if path == os.curdir: paths = os.listdir(path)
-    else: paths = [os.path.join(path, p) for p in os.listdir(path)]
-    paths = [p+os.path.sep if os.path.isdir(p) else p for p in paths]
-    return paths
+    if path == os.curdir: return [name+os.path.sep if is_dir else name for name, is_dir in dir_index.listing(path)]
+    return [os.path.join(path, name)+(os.path.sep if is_dir else "") for name, is_dir in dir_index.listing(path)]
+
+
+def file_infos():
+    with file_lock: return list(files.values())
 
 
 def file_to_key(path): return os.path.abspath(path).replace("\\", "/").lower()
@@ -274,6 +972,7 @@ def goto_link(event):
 
                 link = widget.get(x,y)
                 if link.startswith("http://") or link.startswith("https://"):
+                    import webbrowser
                     webbrowser.open(widget.get(x,y))
                 else:
                     path = link.split("//", maxsplit=1)[1]
@@ -283,70 +982,130 @@ def goto_link(event):
                     if len(loc) == 2: line,char = loc
                     elif len(loc) == 1: line = loc[0]; char = 0
                     else: line=char=0
-                    paths = [files[p]["path"] for p in files.keys()]
+                    paths = [f["path"] for f in file_infos()]
                     paths = zip(paths, shorten_paths(paths))
                     tab_path = next((x for x, y in paths if y.endswith(path)), "")
                     if tab_path: file_open(tab_path,tindex=f"{line}.{char}")
                     elif os.path.exists(path): file_open(path, tindex=f"{line}.{char}")
 
 
-def file_create(path, name, ext, mtime, read_only, lines):
+def file_create(path, name, ext, mtime, read_only, text):
     if is_main_thread():
-        widget = EventText(root, wrap='none', undo=True, **config["text"])
+        widget = EventText(top, wrap='none', undo=True, **config["text"])
         widget.path = path
         widget.name = name
         widget.ext = ext
         widget.mtime = mtime
-        widget.insert(tk.END, "".join(lines))
+        if is_large(path): widget.large = LargeFile(path); large_window(widget, 0)
+        else: load_text(widget, text)
         if read_only: widget.mark_set(tk.INSERT, tk.END)
         else: widget.mark_set(tk.INSERT, "1.0")
         widget.edit_reset()
         widget.edits = False
-        widget.read_only = read_only
-        if read_only: widget.configure(state=tk.DISABLED)
+        widget.read_only = read_only or widget.large != None
+        if widget.read_only: widget.configure(state=tk.DISABLED)
+        if read_only and not widget.large:
+            # an unchanged mtime means the text is the whole file as it is now, so appends tail from its size.
+            try: st = os.stat(path)
+            except OSError: st = None
+            if st and st.st_mtime == mtime: tail_start(widget, st.st_size, st.st_ino)
         widget.edit_modified(False)
     else: widget = [path, name, ext, mtime, read_only]
     return widget
 
 
 def file_get(path, read_only=False, cache=None):
-    global files
     key = file_to_key(path)
     if key in files:
-        info = files.pop(key)
         if not is_main_thread(): file_lock.acquire(); gui_lock.acquire()
-        if isinstance(info["editor"], list): info["editor"] = file_create(*info["editor"], info["lines"])
-        files = {**{key:info}, **files}
+        info = files[key]
+        if isinstance(info["editor"], list):
+            if os.path.isfile(path) and (mtime := os.path.getmtime(path)) != info["mtime"]:
+                try: info["data"] = pack_text("" if is_large(path) else open(path).read()); info["mtime"] = info["editor"][3] = mtime
+                except Exception as e: print("error: file://"+path+" - "+str(e))
+            info["editor"] = file_create(*info["editor"], file_text(info))
+            if not isinstance(info["editor"], list):
+                info["data"] = None
+                if "view" in info: info["editor"].mark_set(tk.INSERT, info["view"][0]); info["editor"].yview_moveto(info["view"][1])
+        files.move_to_end(key, last=False)
         if not is_main_thread(): file_lock.release(); gui_lock.release()
         return info
     name = os.path.basename(path)
     _, ext = os.path.splitext(path)
-    if cache: lines, mtime = cache
-    else: lines = []; mtime = 0
+    if cache: text, mtime = cache
+    else: text = ""; mtime = 0
+    rest = None
     if path and os.path.exists(path) and os.path.isfile(path):
         nmtime = os.path.getmtime(path)
         if nmtime != mtime:
             mtime = nmtime
-            try: lines = open(path).readlines()
+            try:
+                if is_large(path): text = ""
+                elif is_main_thread() and (size := os.path.getsize(path)) > load_head: rest = open(path); text = rest.read(load_head)
+                else: text = open(path).read()
             except Exception as e: print("error: file://"+path+" - "+str(e)); return None
     
-    widget = file_create(path, name, ext, mtime, read_only, lines)
-    file_info = {"path":path, "editor":widget, "lines": lines, "mtime": mtime}
+    widget = file_create(path, name, ext, mtime, read_only, text)
+    if rest: load_start(widget, rest, len(text), size)
+    file_info = {"path":path, "editor":widget, "data": pack_text(text) if isinstance(widget, list) else None, "mtime": mtime}
+    if path: watcher.add(path)
     if not is_main_thread(): file_lock.acquire()
-    files = {**{key:file_info}, **files}
+    files[key] = file_info
+    files.move_to_end(key, last=False)
     if not is_main_thread(): file_lock.release()
     return file_info
 
 
+def pack_text(text): return zlib.compress(text.encode(), 1)
+
+
+def file_text(info):
+    if not isinstance(info["editor"], list): return info["editor"].text
+    return zlib.decompress(info["data"]).decode() if info["data"] else ""
+
+
+def file_stash(info):
+    widget = info["editor"]
+    info["view"] = (widget.index(tk.INSERT), widget.yview()[0])
+    info["data"] = None if widget.large else pack_text(widget.text)
+    info["editor"] = [widget.path, widget.name, widget.ext, widget.mtime, widget.read_only]
+    destroy_list.append(widget)
+
+
+def evict_widgets():
+    budget = config.get("max_widgets", 32)
+    for info in file_infos():
+        widget = info["editor"]
+        if isinstance(widget, list): continue
+        if budget > 0 or window_shown(widget) or widget.edits or widget.loading or (widget.path == find_path and find_active): budget -= 1; continue
+        file_stash(info)
+
+
+def tab_memory():
+    total = 0
+    print("tab memory (estimated resident bytes)")
+    for info in file_infos():
+        widget = info["editor"]
+        if isinstance(widget, list): size = len(info["data"] or b""); kind = "stored"
+        else: size = sum(map(sys.getsizeof, widget.doc.lines()))+widget.doc.offset(sys.maxsize, 0)[1]; kind = "mapped" if widget.large else "widget"
+        total += size
+        print(f"{size/1024:10.1f} KB  {kind}  file://{info['path']}")
+    print(f"{total/1024:10.1f} KB  total for {len(files)} tabs", flush=True)
+    show_stdout()
+
+
 def file_close(path):
     global current_file
-    global files
     key = file_to_key(path)
     print("close: file://"+path)
     info = files.pop(key)
+    watcher.remove(path)
     if info and not isinstance(info["editor"], list): destroy_list.append(info["editor"])
+    wake()
     current_file = ""
-    if files: file_open(next(iter(files)))
+    rest = [v["path"] for v in file_infos() if not window_shown(v["editor"])]
+    if rest: file_open(rest[0])
+    elif len(windows) > 1: window_close(active)
     else: root.quit()
 
 
@@ -355,49 +1114,95 @@ def set_debug(enabled):
     debug_output = enabled
 
 
-def save_file(path):
-    global files
-    if not os.path.exists(path) or os.path.isfile(path):
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w") as output_file:
-            text = editor.get(1.0, 'end-1c')
-            output_file.write(text)
-        key = file_to_key(path)
-        if key in files: files[key]["lines"] = text.splitlines()
-        if path == current_file:
-            editor.edits = False
-            editor.extern_edits = False
-            editor.mtime = os.path.getmtime(path)
-            update_title(editor)
-            editor.edit_modified(0)
+def save_file(path, then=None):
+    widget = editor
+    if widget.loading: print(f"error: file://{widget.path} is still loading, not saved"); return root.bell()
+    if os.path.exists(path) and not os.path.isfile(path): return
+    # the doc text is an immutable snapshot. presses while a save is in flight collapse into one follow up save.
+    thens = [then] if then else []
+    if path in saving:
+        if saving[path]: thens = saving[path][3]+thens
+        saving[path] = (widget, widget.text, widget.version, thens); return
+    saving[path] = None
+    save_start(path, widget, widget.text, widget.version, thens)
+    update_title(widget)
+
+
+def save_start(path, widget, text, version, thens):
+    executor.submit(write_file, path, text, done=lambda mtime: save_done(path, widget, version, thens, mtime))
+
+
+def write_file(path, text):
+    # written beside the target, fsynced and swapped in, so a crash never leaves a truncated file.
+    # a symlink is resolved first so the link is kept and the file it points at is the one replaced.
+    path = os.path.realpath(path)
+    dir = os.path.dirname(path)
+    os.makedirs(dir, exist_ok=True)
+    tmp = "/".join((dir, f".{os.path.basename(path)}.{os.getpid()}.tmp"))
+    try:
+        with open(tmp, "w") as f: f.write(text); f.flush(); os.fsync(f.fileno())
+        if os.path.exists(path): shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(dir, os.O_DIRECTORY)
+        try: os.fsync(fd)
+        finally: os.close(fd)
+    return os.path.getmtime(path)
+
+
+def save_done(path, widget, version, thens, mtime):
+    pending = saving.pop(path)
+    alive = widget.winfo_exists()
+    if mtime == None: print(f"error: file://{path} not saved", flush=True); root.bell()
+    else:
+        if alive and widget.path == path:
+            widget.mtime = mtime
+            widget.extern_edits = False
+            if widget.version == version: widget.edits = False; widget.edit_modified(0)
+        executor.submit(index_file, path)
         if path == conf_path: apply_config(editor)
+        for then in thens: then()
+    if pending: saving[path] = None; save_start(path, *pending)
+    if alive: update_title(widget)
 
 
 def file_open(path, new_inst=False, read_only=False, background=False, tindex=None):
     global root
     global current_file
     global editor
-    global glob_map
     global short_paths
     short_paths = []
-    glob_map = {}
     path = os.path.expanduser(path)
     path = os.path.abspath(path).replace("\\", "/")
     if os.path.isdir(path): return
     if background:
         if file_get(path, read_only) == None: return
     elif not new_inst:
+        info = files.get(file_to_key(path))
+        if info and not isinstance(info["editor"], list) and info["editor"].winfo_toplevel() is not top:
+            # widgets can't move between windows: focus the window showing it, otherwise stash it and realise it here.
+            widget = info["editor"]
+            if window_shown(widget) or widget.edits or widget.loading:
+                owner = next(w for w in windows if w["top"] is widget.winfo_toplevel())
+                owner["top"].deiconify(); owner["top"].lift(); window_activate(owner)
+            else: file_stash(info)
         if path == current_file: return
         current_file = path
         editor.pack_forget()
         editor.config()
         file_info = file_get(current_file, read_only)
         editor = file_info["editor"]
-        if tindex: editor.mark_set(tk.INSERT, tindex); editor.see(tk.INSERT)
+        if tindex and editor.large: large_goto(editor, tindex)
+        elif tindex: editor.mark_set(tk.INSERT, tindex); editor.see(tk.INSERT)
         apply_config(editor)
         editor.pack(before=palette, expand=True, fill="both")
         update_title(editor)
-        update_tags(editor)
+        update_tags(editor, True)
+        evict_widgets()
+        wake()
         editor.lower()
         editor.focus_set()
     elif os.path.exists(path):
@@ -477,6 +1282,7 @@ def select_all(widget):
 
 
 def find_text(widget, text, backwards = False):
+    if widget.large and text: return large_find(widget, text, backwards)
     forward = not backwards
     if text:
         start = widget.index(tk.INSERT)
@@ -497,180 +1303,382 @@ def find_text(widget, text, backwards = False):
     return "break"
 
 
-def search_lines(widget, search_text):
+def search_lines(lines, pat):
     matching_lines = []
-    start_index = "1.0"
-    while True:
-        start_index = widget.search(search_text, start_index, stopindex=tk.END, nocase=True)
-        if not start_index: break
-        matching_lines.append((start_index,widget.get(f"{start_index} linestart", f"{start_index} lineend")))
-        start_index = f"{start_index}+{len(search_text)}c"
+    for row, line in enumerate(lines):
+        if match := pat.search(line): matching_lines.append((row+1, match.start(), line.strip()))
 
     return matching_lines
 
 
+def trigrams(data):
+    data = data.lower()
+    return {a<<16|b<<8|c for a,b,c in set(zip(data, data[1:], data[2:]))}
+
+
+def regex_trigrams(pattern):
+    try: import re._parser as sre_parse
+    except ImportError: import sre_parse
+    grams = set()
+    def walk(items):
+        run = []
+        for op, arg in items:
+            if op == sre_parse.LITERAL: run.append(chr(arg)); continue
+            grams.update(trigrams("".join(run).encode())); run.clear()
+            if op == sre_parse.SUBPATTERN: walk(arg[-1])
+        grams.update(trigrams("".join(run).encode()))
+    try: walk(sre_parse.parse(pattern))
+    except Exception: return set()
+    return grams
+
+
+def index_file(path):
+    try:
+        trigram_index.load()
+        mtime, data = os.path.getmtime(path), open(path, "rb").read(TrigramIndex.max_size+1)
+        if len(data) <= TrigramIndex.max_size: trigram_index.update(path, mtime, trigrams(data))
+    except OSError: pass
+
+
+def find_in_files(paths, pattern, index=()):
+    pat = re.compile(pattern)
+    results = []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_size == 0: results.append((path, [], stat.st_mtime, set() if path in index else None)); continue
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError): results.append((path, None, 0, None)); continue
+        with data:
+            matches = []
+            pos = counted = line = 0
+            while pos <= len(data) and (match := pat.search(data, pos)):
+                start = match.start()
+                line += data[counted:start].count(b"\n"); counted = start
+                line_start = data.rfind(b"\n", 0, start)+1
+                line_end = data.find(b"\n", start)
+                if line_end == -1: line_end = len(data)
+                col = len(data[line_start:start].decode(errors="ignore"))
+                matches.append((line+1, col, data[line_start:line_end].decode(errors="replace").strip()))
+                pos = line_end+1
+            grams = trigrams(data[:]) if path in index and len(data) <= TrigramIndex.max_size else None
+            results.append((path, matches, stat.st_mtime, grams))
+    return results
+
+
 def find_all(text):
-    log_path = "/".join((_sess_dir,"find_all.log"))
-    log_file = open(log_path, "w")
+    global find_generation, find_active
+    find_generation += 1
+    generation = find_generation
+    find_feed.clear()
     msg = f"find all results matching: {text}\nin {len(files)} files"
-    print(msg, file=log_file)
-    print("".ljust(len(msg), "-"), file=log_file, flush=True)
-    file_open(log_path, read_only=True); root.update()
-    args = list(zip([f["path"] for f in files.values()], files.values()))
-    pat = re.compile(text)
-    def find_worker(args):
-        for k, v in args:
-            if isinstance(v["editor"], list):
-                lines = v["lines"]
-                lines = [f"file://{k}:{l[0]}: {l[1].strip()}" for l in zip(range(1, len(lines)), lines) if pat.search(l[1])]
-                for l in lines: safe_print(l, file=log_file)
+    file_open(find_path, read_only=True)
+    widget = files[file_to_key(find_path)]["editor"]
+    widget.configure(state=tk.NORMAL)
+    widget.delete("1.0", tk.END)
+    widget.insert(tk.END, f"{msg}\n{''.ljust(len(msg), '-')}\n")
+    widget.configure(state=tk.DISABLED)
+    try: pat = re.compile(text); re.compile(text.encode())
+    except re.error as e: find_feed.append((generation, "line", f"error: {e}\n")); return
+    infos = {v["path"]:v for v in file_infos() if v["path"] != find_path}
+    edited = {k:list(v["editor"].doc.lines()) for k,v in infos.items() if not isinstance(v["editor"], list) and v["editor"].edits}
+    paths = [k for k in infos if k not in edited]
+    def find_worker():
+        global find_active
+        try: find_search()
+        finally:
+            if generation == find_generation: find_active = False
+    def find_search():
+        start = time.time()
+        count = found = done = 0
+        def write(path, matches):
+            nonlocal count, found
+            matches = matches[:find_cap-count]
+            if matches: find_feed.append((generation, "line", "".join(f"file://{path}:{line}:{col}: {out}\n" for line, col, out in matches)))
+            count += len(matches); found += bool(matches)
+        trigram_index.load()
+        candidates = trigram_index.candidates(regex_trigrams(text))
+        stale = set()
+        for path in paths:
+            try: mtime = os.path.getmtime(path)
+            except OSError: continue
+            if trigram_index.stale(path, mtime): stale.add(path)
+        searched = [k for k in paths if k in stale or candidates == None or k in candidates]
+        chunks = iter([(searched[i:i+find_chunk], stale.intersection(searched[i:i+find_chunk])) for i in range(0, len(searched), find_chunk)])
+        for path, lines in edited.items(): write(path, search_lines(lines, pat))
+        pool, pending = executor.pool(process=True), collections.deque()
+        while True:
+            for chunk, index in itertools.islice(chunks, find_window-len(pending)): pending.append(pool.submit(find_in_files, chunk, text.encode(), index))
+            if not pending or generation != find_generation or count >= find_cap: break
+            try: results = pending.popleft().result()
+            except Exception as e: find_feed.append((generation, "line", f"error: {e}\n")); continue
+            for path, matches, mtime, grams in results:
+                if matches == None: matches = search_lines(file_text(infos[path]).splitlines(True), pat)
+                if grams != None: trigram_index.update(path, mtime, grams)
+                write(path, matches)
+                done += 1
+            find_feed.append((generation, "status", f"searched {done}/{len(searched)} files, {count} matches in {found} files"))
+        for future in pending: future.cancel()
+        if generation == find_generation:
+            if count >= find_cap: status = f"stopped at {count} matches in {found} files"
+            else: status = f"done. {count} matches in {found} files"
+            find_feed.append((generation, "status", f"{status}, searched {len(searched)} ({len(stale)} indexed). {time.time()-start:.2f} secs"))
+        trigram_index.save()
+    find_active = True
+    executor.submit(find_worker)
+
+
+def find_drain():
+    global find_generation, find_active
+    key = file_to_key(find_path)
+    if not find_feed: return
+    if not key in files or isinstance(files[key]["editor"], list):
+        # the results tab was closed, so the search is stopped rather than left feeding a widget that isn't there.
+        find_generation += 1; find_active = False; find_feed.clear(); return
+    widget = files[key]["editor"]
+    text, status = [], None
+    while find_feed and len(text) < 256:
+        generation, kind, out = find_feed.popleft()
+        if generation != find_generation: continue
+        if kind == "status": status = out
+        else: text.append(out)
+    follow = widget.compare(tk.INSERT, ">=", "end - 1c")
+    widget.configure(state=tk.NORMAL)
+    if status: widget.delete("2.0", "2.end"); widget.insert("2.0", status)
+    if text: widget.insert(tk.END, "".join(text))
+    widget.configure(state=tk.DISABLED)
+    if follow and text: widget.mark_set(tk.INSERT, tk.END); widget.see(tk.INSERT)
+
+
+def build_grammars(dir, mtimes):
+    import tree_sitter
+    sitter = "tree-sitter-"
+    languages = {d.replace(sitter, ""):{"path":dir+d, "info":json.load(open(dir+d+"/package.json"))} for d in mtimes}
+    tree_sitter.Language.build_library(sitter_dll, [l["path"] for _,l in languages.items()])
+
+    def get_highlights(name):
+        highlights = []
+        infos = languages[name]["info"]["tree-sitter"]
+        for info in infos:
+            if "highlights" in info:
+                for highlight in info["highlights"]:
+                    if sitter in highlight:
+                        highlights.append(dir+sitter+highlight.split(sitter, maxsplit=1)[1])
+                    elif highlight.startswith("queries"):
+                        highlights.append(dir+sitter+name+"/"+highlight)
             else:
-                if v["editor"].path == log_path: continue
-                for l in search_lines(v["editor"], text):
-                    line,row,out = *l[0].split("."), l[1]
-                    safe_print(f"file://{k}:{line}:{row}: {out}", file=log_file)
-    def do_work(): share_work(find_worker, args, log_file=log_file, max_threads=128)
-    threading.Thread(target=do_work).start()
+                highlights = [f"{dir}{sitter}{name}/queries/highlights.scm"]
+        return highlights
+    extensions = {ext:k for k,v in languages.items() for info in v["info"]["tree-sitter"] for ext in info["file-types"]}
+    registry = {"search_path": dir, "dir_mtime": os.stat(dir).st_mtime, "mtimes": mtimes, "extensions": extensions, "highlights": {k:get_highlights(k) for k in languages}}
+    json.dump(registry, open(grammars_path, "w"), indent=4)
+    language_cache.clear()
+    print(f"built {len(languages)} tree-sitter grammars to {sitter_dll}")
+    return registry
+
+
+def get_grammars(ext):
+    global grammars
+    with grammar_lock:
+        dir = os.path.expanduser(config["tree-sitter"]["search_path"])
+        scan = lambda: {d:os.path.getmtime(dir+d) for d in os.listdir(dir) if d.startswith("tree-sitter-")}
+        if grammars == None:
+            try: grammars = json.load(open(grammars_path)); grammars["checked"] = False
+            except Exception: grammars = {}
+        try: dir_mtime = os.stat(dir).st_mtime
+        except OSError: dir_mtime = None
+        try:
+            if grammars.get("search_path") != dir:
+                grammars = build_grammars(dir, scan()); grammars["checked"] = True
+            # an extension no grammar claims costs one stat, cloning or removing a grammar changes the search path's mtime.
+            if not ext in grammars["extensions"] and grammars.get("dir_mtime") == dir_mtime: return None
+            if not grammars["checked"] or grammars.get("dir_mtime") != dir_mtime:
+                if (mtimes := scan()) != grammars["mtimes"] or not os.path.exists(sitter_dll): grammars = build_grammars(dir, mtimes)
+                elif grammars.get("dir_mtime") != dir_mtime:
+                    grammars["dir_mtime"] = dir_mtime
+                    json.dump({k:v for k,v in grammars.items() if k != "checked"}, open(grammars_path, "w"), indent=4)
+                grammars["checked"] = True
+        except Exception as e:
+            print("tree-sitter grammars error: "+str(e), file=sys.__stdout__)
+            grammars = {"search_path": dir, "dir_mtime": dir_mtime, "mtimes": {}, "extensions": {}, "highlights": {}, "checked": True}
+        return grammars if ext in grammars["extensions"] else None
 
 
 def init_treesitter(widget: EventText):
     try:
-        text = widget.text
-        dir = os.path.expanduser(config["tree-sitter"]["search_path"])
-        sitter = "tree-sitter-"
-        sitter_dll = "/".join([_grampy_dir, "treesitter.dll"])
-        languages = {d.replace(sitter, ""):{"path":dir+d, "info":json.load(open(dir+d+"/package.json"))} for d in os.listdir(dir) if d.startswith(sitter)}
-        tree_sitter.Language.build_library(sitter_dll, [l["path"] for _,l in languages.items()])
-        
-        def get_language(path):
-            _, ext = os.path.splitext(path)
-            ext = ext[1:]
-            for k,v in languages.items():
-                infos = v["info"]["tree-sitter"]
-                for info in infos:
-                    exts = info["file-types"]
-                    if ext in exts: return tree_sitter.Language(sitter_dll, k)
-        
-        def get_highlights(name):
-            highlights = []
-            if name in languages:
-                infos = languages[name]["info"]["tree-sitter"]
-                for info in infos:
-                    if "highlights" in info:
-                        for highlight in info["highlights"]:
-                            if sitter in highlight:
-                                highlights.append(dir+sitter+highlight.split(sitter, maxsplit=1)[1])
-                            elif highlight.startswith("queries"):
-                                highlights.append(dir+sitter+name+"/"+highlight)
-                    else:
-                        highlights = [f"{dir}{sitter}{name}/queries/highlights.scm"]
-            return highlights
-        lang = get_language(widget.path)
-        if lang:
+        import tree_sitter
+        _, ext = os.path.splitext(widget.path)
+        registry = get_grammars(ext[1:])
+        if registry:
+            name = registry["extensions"][ext[1:]]
+            if not name in language_cache: language_cache[name] = tree_sitter.Language(sitter_dll, name)
+            lang = language_cache[name]
             widget.language = lang
-            widget.highlights = get_highlights(lang.name)
+            widget.highlights = registry["highlights"][name]
             parser = tree_sitter.Parser(); parser.set_language(lang)
             widget.parser = parser
-            widget.tree = parser.parse(text.encode())
-            
     except Exception as e:
         print(widget.path+" tree-sitter error: "+str(e), file=sys.__stdout__)
 
 
-def update_tags(widget: EventText):
-    def internal_update(widget: EventText):
-        debug_it = False
-        if debug_it: print(widget.name.center(64,"-"), file=sys.__stdout__)
-        text = widget.text
-        tag_names = widget.tag_names()
-        changes = widget.changes
-        tags = {}
-        if debug_it: start = time.time()
-        if widget.language == None: init_treesitter(widget)
-        if widget.highlights:
-            nodes = []
-            tree_root = widget.tree.root_node
-            if changes:
-                for change in changes:
-                    for child in tree_root.children:
-                        if change.start_byte <= child.start_byte and change.end_byte >= child.end_byte or \
-                            change.start_byte >= child.start_byte and change.end_byte <= child.end_byte:
-                            nodes.append(child)
-                            if debug_it: print(f"node: {child}", file=sys.__stdout__)
-            else:
-                nodes.append(tree_root)
-            
-            for highlight in widget.highlights:
-                if os.path.exists(highlight): highlight = open(highlight).read()
-                else: highlight = None
-                if highlight:
-                    for node in nodes:
-                        if debug_it: q_start = time.time()
-                        query = widget.language.query(highlight)
-                        for change in changes:
-                            captures = query.captures(node, start_byte=change.start_byte, end_byte=change.end_byte)
-                        else:
-                            captures = query.captures(node)
-                        if debug_it: print(f"treesitter_query: {time.time()-q_start}", file=sys.__stdout__)
-                        if debug_it: q_start = time.time()
-                        tid = lambda y: f"{y[0]+1}.{y[1]}"
-                        
-                        for info, key in captures:
-                            if not key in config["tags"]: continue
-                            if not key in tags: tags[key] = [[tid(info.start_point), tid(info.end_point), info.start_byte, info.end_byte]]
-                            else: tags[key].extend([[tid(info.start_point), tid(info.end_point), info.start_byte, info.end_byte]])
-                        if debug_it: print(f"treesitter_spans: {time.time()-q_start}", file=sys.__stdout__)
-        if debug_it: print(f"treesitter: {time.time()-start}", file=sys.__stdout__)
-
-        if debug_it: start = time.time()
-
-        for regex in config["regexs"]:
-            byte_changes = [[c.start_byte-1, c.end_byte+1] for c in changes] if changes else [[0, sys.maxsize]]
-            for change in byte_changes:
-                for match in regex.finditer(text, *change):
-                    groups = {k:v for k,v in match.groupdict().items() if v}
-                    for k in groups:
-                        sp_start, sp_end = match.span(k)
-                        ti_start = f"1.0 + {sp_start}c"
-                        ti_end = f"1.0 + {sp_end}c"
-                        if not k in tags: tags[k] = [[ti_start, ti_end, sp_start, sp_end]]
-                        else: tags[k].extend([[ti_start, ti_end, sp_start, sp_end]])
-        if debug_it: print(f"regex: {time.time()-start}", file=sys.__stdout__)
-        
-        if debug_it: start = time.time()
-        for tag in tag_names:
-            if tag in [tk.SEL]: continue
-            if not tag in tags: tags[tag] = []
-        
-        if changes:
-            if debug_it:
-                print("changes: ", file=sys.__stdout__)
-                for change in changes: print(widget.get(f"1.0 +{change.start_byte}c", f"1.0 + {change.end_byte}c"), file=sys.__stdout__)
-                print("tags: ", file=sys.__stdout__)
-                for k,v in tags.items(): print(f"\t{k}: {len(v)}", file=sys.__stdout__)
-            new_tags = []
-            for tag, spans in tags.items():
-                for change in changes:
-                    new_tags.append(lambda x=widget, y=tag, z=change: x.tag_remove(y, f"1.0 + {z.start_byte}c", f"1.0 + {z.end_byte}c"))
-                for span in spans: new_tags.append(lambda x=widget,y=tag,z=span[:2]: x.tag_add(y, *z))
-            widget.tag_queue = [*new_tags, *widget.tag_queue]
-            widget.changes = widget.changes[len(changes):]
-        else:
-            if debug_it:
-                print("full parse: ", file=sys.__stdout__)
-                print("tags: ", file=sys.__stdout__)
-                for k,v in tags.items(): print(f"\t{k}: {len(v)}", file=sys.__stdout__)
-            widget.tag_queue = []
-            for tag, spans in tags.items():
-                widget.tag_queue.append(lambda x=widget, y=tag: x.tag_remove(y, "1.0", "end-1c"))
-                for span in spans: widget.tag_queue.append(lambda x=widget,y=tag,z=span[:2]: x.tag_add(y, *z))
-                    
-        if debug_it: print(f"tags: {time.time()-start}", file=sys.__stdout__)
-        if debug_it: print("done", file=sys.__stdout__)
-        if debug_it: print("".ljust(64,"-"), file=sys.__stdout__)
-    
-    if not [x for x in threading.enumerate() if x.name == "update_tags"]:
-        threading.Thread(target=internal_update, args=[widget], name="update_tags").start()
+def parse_treesitter(widget: EventText):
+    # parsed from a snapshot outside the lock. edits skip a widget without a tree, so the tree is only kept if none landed meanwhile.
+    with widget.lock: doc = widget.doc; version = doc.version; data = doc.text.encode()
+    tree = widget.parser.parse(data)
+    with widget.lock:
+        if widget.doc is doc and doc.version == version: widget.tree = tree
+
+
+def get_query(language, path):
+    try: mtime = os.path.getmtime(path)
+    except OSError: return None
+    key = (language.name, path)
+    with query_lock:
+        if key in query_cache and query_cache[key][0] == mtime: return query_cache[key][1]
+    query = language.query(open(path).read())
+    with query_lock: query_cache[key] = (mtime, query)
+    return query
+
+
+def spans_add(spans, start, end):
+    out = []
+    for s, e in spans:
+        if e < start or s > end: out.append((s, e))
+        else: start, end = min(s, start), max(e, end)
+    return sorted(out+[(start, end)])
+
+
+def spans_remove(spans, start, end):
+    out = []
+    for s, e in spans:
+        if e <= start or s >= end: out.append((s, e)); continue
+        if s < start: out.append((s, start))
+        if e > end: out.append((end, e))
+    return out
+
+
+def spans_shift(spans, row, delta):
+    shift = lambda x: x if x <= row else max(row+1, x+delta)
+    return [(shift(s), shift(e)) for s, e in spans if shift(e) > shift(s)]
+
+
+def next_region(widget: EventText, idle=True):
+    count = widget.doc.line_count()
+    if widget.tagged == [(0, count)]: return None, False
+    gaps = [(0, count)]
+    for s, e in widget.tagged+widget.pending: gaps = spans_remove(gaps, s, e)
+    if not gaps: return None, False
+    first = int(widget.index("@0,0").split(".")[0])-1
+    last = int(widget.index(f"@0,{widget.winfo_height()}").split(".")[0])
+    margin = last-first
+    view = (max(0, first-margin), min(count, last+margin))
+    for s, e in gaps:
+        if e > view[0] and s < view[1]:
+            s = max(s, view[0])
+            return (s, min(e, view[1], s+tag_chunk)), True
+    if not idle: return None, False
+    s, e = min(gaps, key=lambda x: x[0]-view[1] if x[0] >= view[1] else view[0]-x[1])
+    return ((s, min(e, s+tag_chunk)) if s >= view[1] else (max(s, e-tag_chunk), e)), False
+
+
+def regex_tags(lines, first, tags):
+    for row, line in enumerate(lines, first+1):
+        matches = regex_cache.get(line)
+        if matches == None:
+            matches = [(k, *match.span(k)) for regex in config["regexs"] for match in regex.finditer(line) for k,v in match.groupdict().items() if v]
+            if len(regex_cache) >= regex_cache_size: regex_cache.clear()
+            regex_cache[line] = matches
+        for k, sp_start, sp_end in matches:
+            if not k in tags: tags[k] = [f"{row}.{sp_start}", f"{row}.{sp_end}"]
+            else: tags[k].extend((f"{row}.{sp_start}", f"{row}.{sp_end}"))
+
+
+def highlight_region(widget: EventText, tag_names, region, version):
+    debug_it = False
+    if debug_it: print(widget.name.center(64,"-"), file=sys.__stdout__)
+    first, last = region
+    tags = {}
+    if debug_it: start = time.time()
+    if widget.language == None: init_treesitter(widget)
+    if widget.parser != None and widget.tree == None: parse_treesitter(widget)
+    # only the snapshot is taken under the lock, the main thread splices the doc and edits the tree while the query runs.
+    with widget.lock:
+        if widget.version != version: return None
+        tree = widget.tree
+        if tree != None and hasattr(tree, "copy"): tree = tree.copy()
+        lines = widget.doc.line_range(first, last)
+    def tid(point):
+        row, col = point
+        if row < first: return f"{first+1}.0"
+        if row >= first+len(lines): return f"{last+1}.0"
+        line = lines[row-first]
+        return f"{row+1}.{col if line.isascii() else len(line.encode()[:col].decode(errors='ignore'))}"
+    if widget.highlights and tree != None:
+        for highlight in widget.highlights:
+            if widget.version != version: return None
+            if debug_it: q_start = time.time()
+            query = get_query(widget.language, highlight)
+            if debug_it: print(f"treesitter_compile: {time.time()-q_start}", file=sys.__stdout__)
+            if query:
+                if debug_it: q_start = time.time()
+                captures = query.captures(tree.root_node, start_point=(first, 0), end_point=(last, 0))
+                if debug_it: print(f"treesitter_query: {time.time()-q_start}", file=sys.__stdout__)
+                if debug_it: q_start = time.time()
+                for info, key in captures:
+                    if not key in config["tags"]: continue
+                    if not key in tags: tags[key] = [tid(info.start_point), tid(info.end_point)]
+                    else: tags[key].extend((tid(info.start_point), tid(info.end_point)))
+                if debug_it: print(f"treesitter_spans: {time.time()-q_start}", file=sys.__stdout__)
+    if debug_it: print(f"treesitter: {time.time()-start}", file=sys.__stdout__)
+
+    if widget.version != version: return None
+    if debug_it: start = time.time()
+
+    regex_tags(lines, first, tags)
+    if debug_it: print(f"regex: {time.time()-start}", file=sys.__stdout__)
+
+    if debug_it: start = time.time()
+    for tag in tag_names:
+        if tag in [tk.SEL]: continue
+        if not tag in tags: tags[tag] = []
+
+    if debug_it:
+        print(f"region: {first+1}-{last} version: {version}", file=sys.__stdout__)
+        print("tags: ", file=sys.__stdout__)
+        for k,v in tags.items(): print(f"\t{k}: {len(v)//2}", file=sys.__stdout__)
+    new_tags = []
+    for tag, spans in tags.items():
+        new_tags.append(["remove", tag, [f"{first+1}.0", f"{last+1}.0"], 0])
+        if spans: new_tags.append(["add", tag, spans, 0])
+    new_tags.append(["done", None, region, 0])
+
+    if debug_it: print(f"tags: {time.time()-start}", file=sys.__stdout__)
+    if debug_it: print("done", file=sys.__stdout__)
+    if debug_it: print("".ljust(64,"-"), file=sys.__stdout__)
+    if widget.version != version: return None
+    return new_tags
+
+
+def highlight_pending(widget: EventText):
+    return sum(e-s for s, e in widget.tagged+widget.pending) < widget.doc.line_count()
+
+
+def update_tags(widget: EventText, full=False):
+    if widget.loading: return
+    highlighter = widget.highlighter
+    if full:
+        widget.version += 1
+        widget.tagged = []; widget.pending = []
+        widget.tag_queue.clear()
+    while highlighter.results:
+        version, region, visible, ops = highlighter.results.popleft()
+        if version == widget.version: widget.tag_queue.push(ops, visible)
+    if highlighter.busy or time.time()-widget.edit_time < highlight_delay: return
+    region, visible = next_region(widget, not widget.tag_queue)
+    if region:
+        widget.pending = spans_add(widget.pending, *region)
+        highlighter.request(region, visible, widget.tag_names(), widget.version)
 
 
 def editor_modified(widget):
@@ -750,8 +1758,24 @@ def complist_update_start(text, force = False):
             match_func = lambda x: [k+": " for k in commands if x in k]
 
         if match_func:
-            def match_thread(match_func, text): complist_update_end(text, match_func(text))
-            threading.Thread(target=match_thread, args=(match_func, text), name="matching").start()
+            def match_thread(match_func, text, full):
+                matches = match_func(text)
+                if matches is None: return
+                if isinstance(matches, list): return complist_update_end(text, matches)
+                # generators are consumed progressively and abandoned as soon as the palette text changes.
+                out, shown, deadline = [], 0, time.perf_counter()+0.05
+                for match in itertools.islice(matches, complist_max):
+                    if last_complist != full: return
+                    out.append(match)
+                    if time.perf_counter() > deadline and len(out) > shown:
+                        complist_update_end(text, list(out)); shown = len(out); deadline = time.perf_counter()+0.25
+                if last_complist == full: complist_update_end(text, out)
+            threading.Thread(target=match_thread, args=(match_func, text, last_complist), name="matching").start()
+
+
+def complist_cancelled():
+    full = last_complist
+    return lambda: last_complist != full
 
 
 def complist_update_end(text, matches):
@@ -793,43 +1817,29 @@ def complist_insert(event=None, sel=-1):
 # -----------------------------------------------------
 
 def cmd_open_matches(text):
-    low_text = text.lower()
-    dirname, basename = os.path.split(low_text)
-    ret = []
-    def file_filter(word):
-        if len(low_text) >= len(word): return False
-        low_word = word.lower()
-        base_word = low_word.replace(dirname, "")
-        return (basename in base_word) or (fnmatch.fnmatch(low_word, low_text))
+    cancelled = complist_cancelled()
     path = os.path.dirname(text)
     expanded = os.path.expanduser(path)
-    if expanded and (os.path.exists(expanded)): ret = list_path(expanded)
-    else: ret = list_path(os.curdir)
-    return sorted(filter(file_filter, ret), key=lambda x: x.lower().index(basename))
+    if expanded and (os.path.exists(expanded)): ret = list_path(expanded); offset = len(os.path.join(expanded, ""))
+    else: ret = list_path(os.curdir); offset = 0
+    basename = os.path.basename(text)
+    if glob.has_magic(basename): return [r for r in ret if fnmatch.fnmatch(r[offset:].lower(), basename.lower())]
+    return open_matcher.match(basename, ret, complist_max, offset, cancelled)
 
 
 def cmd_glob_matches(text):
-    ret = []
-    if text not in glob_map:
-        ret = glob.glob(text, recursive=True)
-        glob_map[text] = ret
-
-    else: ret = glob_map[text]
-
-    if not ret or (len(ret) == 1 and ret[0] == text): ret = cmd_open_matches(text)
-    return ret
+    if not glob.has_magic(text): return cmd_open_matches(text)
+    def matches():
+        found = False
+        for path in dir_index.glob(text): found = True; yield path
+        if not found: yield from cmd_open_matches(text)
+    return matches()
 
 
 def cmd_tab_matches(text):
-    low_text = text.lower()
-    dirname, basename = os.path.split(low_text)
-    def file_filter(word):
-        if len(low_text) >= len(word): return False
-        low_word = word.lower()
-        base_word = low_word.replace(dirname, "")
-        return (basename in base_word) or (fnmatch.fnmatch(low_word, low_text))
-    paths = [files[p]["path"] for p in files.keys()]
-    if paths: return sorted(filter(file_filter, shorten_paths(paths)), key=lambda x: x.lower().index(basename) if basename in x else 999)
+    cancelled = complist_cancelled()
+    paths = [f["path"] for f in file_infos()]
+    if paths: return tab_matcher.match(text, shorten_paths(paths), complist_max, cancelled=cancelled)
     return []
 
 
@@ -839,7 +1849,7 @@ def cmd_cache_matches(text):
     low_text = "_".join(args) if args else cmd
     def file_filter(word): return (low_text in word.lower())
     if cmd in ["load", "save"]:
-        paths = [f.replace(".pkl", "") for f in os.listdir(_grampy_dir) if f.endswith(".pkl")]
+        paths = sorted({os.path.splitext(f)[0] for f in os.listdir(_grampy_dir) if f.endswith((".gcache", ".pkl"))})
         if paths:
             out = sorted(filter(file_filter, paths), key=lambda x: x.lower().index(low_text))
             return [f"{cmd} {o}" for o in out]
@@ -864,56 +1874,180 @@ def cmd_open(text, new_instance=False):
         show_stdout()
         def open_worker(x):
             for y in x: file_open(y, background=True)
-        def open_all(files): share_work(open_worker, files)
         if args:
-            if len(args) > 1: threading.Thread(target=open_all, args=([args]), name="open_all").start()
+            if len(args) > 1:
+                start = time.time()
+                executor.map(open_worker, list(args), finished=lambda: print(f"done. {time.time()-start:.2f} secs", flush=True))
             else: file_open(args[0], new_instance)
     else:
         file_open(text, new_instance)
 
 
 def cmd_tab(text, new_instance=False):
-    paths = [files[p]["path"] for p in files.keys()]
+    paths = [f["path"] for f in file_infos()]
     paths = zip(paths, shorten_paths(paths))
     path = next((x for x, y in paths if y.endswith(text)), "")
     if path: file_open(path, new_instance)
     palette.delete(len("tab: "), tk.END)
 
+# workspace caches: header, then one zlib blob per file (pack_text format), then a compressed json index of
+# [path, mtime, size, offset, length]. saves append changed blobs and a new index, compacting once garbage dominates.
+cache_magic, cache_version = b"GRAMC", 1
+cache_header = struct.Struct("<5sHQQ")
+cache_maps = {}
+
+
+def cache_path(cache_name): return "/".join((_grampy_dir, cache_name+".gcache"))
+
+
+def read_cache_index(path):
+    with open(path, "rb") as f:
+        magic, version, offset, length = cache_header.unpack(f.read(cache_header.size))
+        if magic != cache_magic or version != cache_version: raise ValueError(f"unsupported cache file {path}")
+        f.seek(offset)
+        return json.loads(zlib.decompress(f.read(length)))
+
+
+def save_cache(cache_name):
+    path = cache_path(cache_name)
+    try: old = {e[0]: e for e in read_cache_index(path)}
+    except (OSError, ValueError): old = {}
+    entries, blobs = [], []
+    for info in file_infos():
+        widget = info["editor"]
+        mtime = widget[3] if isinstance(widget, list) else widget.mtime
+        entry = old.get(info["path"])
+        if entry and entry[1] == mtime and (isinstance(widget, list) or not widget.edits): entries.append(entry); continue
+        if getattr(widget, "large", None): text = b""
+        elif getattr(widget, "loading", None): text = open(info["path"]).read().encode()
+        else: text = file_text(info).encode()
+        entries.append([info["path"], mtime, len(text), 0, 0]); blobs.append((entries[-1], zlib.compress(text, 1)))
+    if old and not blobs and [e[0] for e in entries] == list(old): return 0, len(entries)
+    live = sum(e[4] for e in entries)+sum(len(b) for _, b in blobs)
+    size = os.path.getsize(path) if old else 0
+    if old and size < 2*live+(1 << 16):
+        with open(path, "r+b") as f:
+            offset = f.seek(0, os.SEEK_END)
+            for entry, blob in blobs: entry[3:5] = offset, len(blob); f.write(blob); offset += len(blob)
+            index = zlib.compress(json.dumps(entries).encode(), 1)
+            f.write(index); f.flush(); os.fsync(f.fileno())
+            f.seek(0); f.write(cache_header.pack(cache_magic, cache_version, offset, len(index)))
+    else:
+        src = open(path, "rb") if old else None
+        with open(path+".tmp", "wb") as f:
+            offset = f.write(cache_header.pack(cache_magic, cache_version, 0, 0))
+            fresh = {id(entry): blob for entry, blob in blobs}
+            for entry in entries:
+                if id(entry) in fresh: blob = fresh[id(entry)]
+                else: src.seek(entry[3]); blob = src.read(entry[4])
+                entry[3:5] = offset, len(blob); f.write(blob); offset += len(blob)
+            index = zlib.compress(json.dumps(entries).encode(), 1)
+            f.write(index)
+            f.seek(0); f.write(cache_header.pack(cache_magic, cache_version, offset, len(index)))
+            f.flush(); os.fsync(f.fileno())
+        if src: src.close()
+        os.replace(path+".tmp", path)
+    return len(blobs), len(entries)
+
+
 def load_cache(cache_name):
-    global files
-    file_lock.acquire(); files = {}; file_lock.release()
+    path = cache_path(cache_name)
+    if not os.path.exists(path): return load_pickle_cache(cache_name)
+    entries = read_cache_index(path)
+    with open(path, "rb") as f: data = cache_maps[path] = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    with file_lock:
+        files.clear()
+        for fpath, mtime, size, offset, length in entries:
+            files[file_to_key(fpath)] = {"path": fpath, "editor": [fpath, os.path.basename(fpath), os.path.splitext(fpath)[1], mtime, False],
+                                        "data": data[offset:offset+length], "mtime": mtime}
+    for fpath, mtime, *_ in entries: watcher.add(fpath, mtime)
+    print(f"Loaded {len(entries)} files from '{cache_name}' cache")
+    validate_cache(cache_name, entries)
+
+
+def stat_dirs(dirs):
+    # grouped per directory. windows' scandir carries each entry's stat, so one listing covers the directory.
+    # elsewhere DirEntry.stat() is a stat call anyway, so only the cached names are stat'd and the listing is skipped.
+    out = []
+    for dir, names in dirs:
+        stats = {}
+        if os.name == "nt":
+            try:
+                with os.scandir(dir or ".") as it:
+                    for entry in it:
+                        if entry.name in names and entry.is_file(): stats[entry.name] = entry.stat().st_mtime
+            except OSError: pass
+        else:
+            for name in names:
+                try: st = os.stat("/".join((dir, name)) if dir else name)
+                except OSError: continue
+                if stat.S_ISREG(st.st_mode): stats[name] = st.st_mtime
+        out.append((dir, stats))
+    return out
+
+
+def read_stale(paths):
+    out = []
+    for path in paths:
+        try: out.append((path, pack_text("" if is_large(path) else open(path).read())))
+        except Exception as e: print("error: file://"+path+" - "+str(e))
+    return out
+
+
+def validate_cache(cache_name, entries):
+    start = time.perf_counter()
+    dirs = collections.defaultdict(set)
+    for fpath, *_ in entries: dirs[os.path.dirname(fpath)].add(os.path.basename(fpath))
+    stats, stale, missing = {}, {}, 0
+    def read_done(results):
+        with file_lock:
+            for fpath, data in results:
+                info = files.get(file_to_key(fpath))
+                if info and isinstance(info["editor"], list) and info["mtime"] != stale[fpath]:
+                    info["data"] = data; info["mtime"] = info["editor"][3] = stale[fpath]
+    def report():
+        fresh = len(entries)-len(stale)-missing
+        print(f"Validated '{cache_name}' cache: {len(stale)} stale / {fresh} fresh" + (f" / {missing} missing" if missing else "") + f" in {time.perf_counter()-start:.2f}s", flush=True)
+    def stat_finished():
+        nonlocal missing
+        for fpath, mtime, *_ in entries:
+            dir, name = os.path.split(fpath)
+            if not name in stats.get(dir, ()): missing += 1
+            elif stats[dir][name] != mtime: stale[fpath] = stats[dir][name]
+        executor.map(read_stale, list(stale), done=read_done, finished=report)
+    executor.map(stat_dirs, list(dirs.items()), done=stats.update, finished=stat_finished)
+
+
+def load_pickle_cache(cache_name):
+    file_lock.acquire(); files.clear(); file_lock.release()
+    import pickle
     pkl_files = pickle.load(open("/".join((_grampy_dir, cache_name+".pkl")), "rb"))
-    print(f"Loading {len(pkl_files)} files from '{cache_name}' cache")
-    def file_cache(in_files):
-        in_files = list(in_files.items())
-        def cache_worker(files):
-            for k,v in files: file_get(k, cache=v)
-        share_work(cache_worker, in_files, max_threads=32)
-    threading.Thread(target=file_cache, args=([pkl_files]), name="load_cache").start()
+    print(f"Loading {len(pkl_files)} files from legacy '{cache_name}' cache")
+    def cache_worker(files):
+        for k,v in files: file_get(k, cache=("".join(v[0]), v[1]))
+    executor.map(cache_worker, list(pkl_files.items()))
 
 
 def cmd_cache(text, new_instance=False):
-    global files
     cmd, *args = text.split(" ")
     if cmd == "load":
         cache_name = "_".join(args)
         print("Loading cache "+cache_name, flush=True)
         show_stdout()
-        if os.path.exists("/".join((_grampy_dir, cache_name+".pkl"))):
-            threading.Thread(target=load_cache, args=[cache_name]).start()
-            
+        if os.path.exists(cache_path(cache_name)) or os.path.exists("/".join((_grampy_dir, cache_name+".pkl"))):
+            load_cache(cache_name)
+
     elif cmd == "save":
         cache_name = "_".join(args)
         print(f"Saving {len(files)} files to {cache_name}", flush=True)
-        print(f"Clearing cache of {len(files)} files.", flush=True)
         if cache_name:
-            cache = {v["path"]: [v["lines"], v["mtime"]] for k,v in files.items()}
-            pickle.dump(cache, open("/".join((_grampy_dir, cache_name+".pkl")), "wb"))
+            written, total = save_cache(cache_name)
+            print(f"Wrote {written} of {total} files to {cache_name}", flush=True)
 
     elif cmd == "clear":
         print(f"Clearing cache of {len(files)} files.", flush=True)
         show_stdout()
-        file_lock.acquire(); files = {}; file_lock.release()
+        file_lock.acquire(); files.clear(); file_lock.release()
 
 
 def cmd_register(name, command, match_cb=None, shortcut=None):
@@ -923,7 +2057,7 @@ def cmd_register(name, command, match_cb=None, shortcut=None):
     if match_cb: cmd.update({"match_cb": match_cb})
     if shortcut:
         cmd.update({"shortcut": shortcut })
-        root.bind(shortcut, lambda x: palette_op(name))
+        for win in windows: win["top"].bind(shortcut, lambda x: palette_op(name))
     commands[name] = cmd
 
 # -----------------------------------------------------
@@ -931,33 +2065,163 @@ def cmd_register(name, command, match_cb=None, shortcut=None):
 def fullscreen():
     global is_fullscreen
     is_fullscreen = not is_fullscreen
-    root.attributes("-fullscreen", is_fullscreen)
+    top.attributes("-fullscreen", is_fullscreen)
 
 
 if os.name == "nt":
     from ctypes import windll
     windll.shcore.SetProcessDpiAwareness(2)
 
+def window_shown(widget): return widget is editor or any(widget is w["editor"] for w in windows if w is not active)
+
+
+def window_activate(win):
+    # each window owns an editor, palette and completion list. the focused one is swapped into the globals.
+    global top, editor, palette, complist, current_file, active
+    if win is active: return
+    if active: active.update(editor=editor, current_file=current_file)
+    active = win
+    top, editor, palette, complist, current_file = (win[k] for k in ("top", "editor", "palette", "complist", "current_file"))
+
+
+def window_create(window, geo=None):
+    global editor, palette, complist
+    win = {"top": window, "editor": None, "palette": None, "complist": None, "current_file": ""}
+    windows.append(win)
+    window_activate(win)
+    if geo: window.geometry('%dx%d+%d+%d' % (geo[2], geo[3], geo[0], geo[1]))
+    window.wm_iconphoto(False, photo)
+    window.configure(background=config["text"]["background"])
+    window.protocol("WM_DELETE_WINDOW", lambda: window_close(win))
+    window.bind("<FocusIn>", lambda _: window_activate(win))
+    window.bind("<Control-s>", lambda _: save_file(current_file))
+    window.bind("<Control-m>", lambda _: file_open(conf_path))
+    window.bind("<Control-p>", lambda _: show_stdout())
+    for k, v in commands.items():
+        if "shortcut" in v: window.bind(v["shortcut"], lambda x, key=k: palette_op(key))
+
+    editor = EventText(window, wrap='none', undo=True)
+    complist = tk.Listbox(window, relief='flat')
+
+    complist.bind("<Configure>", lambda _: complist_configure())
+    complist.bind("<Double-Button-1>", complist_insert)
+    complist.bind("<Return>", complist_insert)
+    complist.bind("<Tab>", complist_insert)
+    complist.bind("<Escape>", lambda x: palette.focus_set())
+    complist.bind("<Down>", lambda _: "")
+    complist.bind("<Up>", lambda _: "")
+    complist.bind("<Shift_L>", lambda _: "")
+    complist.bind("<Shift_R>", lambda _: "")
+    complist.bind("<Key>", lambda x: (palette.insert(tk.END, x.char), palette.focus_set()))
+    complist.configure(borderwidth=0, selectborderwidth=0)
+    complist.configure(activestyle='none')
+
+    palette = tk.Entry(window)
+    palette.bind("<Control-a>", palette_select_all)
+    palette.bind("<Configure>", lambda _: complist_configure())
+    palette.bind("<Control-w>", lambda x: file_close(editor.path))
+    palette.bind("<KeyRelease>", lambda x: palette_cus() if 31<x.keysym_num<200 else "")
+    palette.bind("<KeyRelease-BackSpace>", palette_cus)
+    palette.bind("<KeyRelease-Delete>", palette_cus)
+    palette.bind('<FocusIn>', lambda x: palette.focus_set())
+    palette.bind("<Control-BackSpace>", lambda x: (delete_to_break(palette), palette_cus()))
+    palette.bind("<Control-Delete>", lambda x: (delete_to_break(palette, False), palette_cus()))
+    palette.bind("<Escape>", lambda x: editor.focus_set())
+    palette.bind("<Tab>", lambda x: complist_insert(None, 0))
+    palette.bind("<Down>", lambda x: (complist.focus_set(), complist.select_set(0)) if complist.size() else "")
+    palette.configure(borderwidth=0)
+    palette.pack(fill="x")
+    win.update(editor=editor, palette=palette, complist=complist)
+    return win
+
+
+def window_open(path, geo=None):
+    window_create(tk.Toplevel(root), geo)
+    apply_config(editor)
+    file_open_default(path)
+    wake()
+
+
+def file_open_default(path):
+    # no path, or one that doesn't exist, opens the readme read only, or else a fresh new_file.txt.
+    if path and os.path.exists(path): return file_open(path)
+    readme = os.path.join(os.path.dirname(__file__),"README.md")
+    if os.path.exists(readme): return file_open(readme, read_only=True)
+    new_file = "new_file.txt"
+    for i in range(0, 1000):
+        if not os.path.exists(new_file): break
+        new_file = f"new_file{i}.txt"
+    file_open(new_file)
+
+
+def window_close(win):
+    global active
+    if len(windows) == 1: return root.quit()
+    infos = [v for v in file_infos() if not isinstance(v["editor"], list) and v["editor"].winfo_toplevel() is win["top"]]
+    if any(v["editor"].edits or v["editor"].loading or v["editor"].path in saving for v in infos):
+        print("error: window has unsaved edits, not closed", flush=True); return root.bell()
+    for info in infos: file_stash(info)
+    windows.remove(win)
+    if win is active: active = None; window_activate(windows[0])
+    if win["top"] is root: root.withdraw()
+    else: win["top"].destroy()
+    wake()
+
+
+def server_start():
+    if os.name == "nt" or not hasattr(socket, "AF_UNIX"): return None
+    try:
+        with socket.socket(socket.AF_UNIX) as probe:
+            # only a socket nobody answers on is stale, a live instance keeps its socket.
+            try: probe.connect(server_path); return None
+            except ConnectionRefusedError: os.remove(server_path)
+            except FileNotFoundError: pass
+        listener = socket.socket(socket.AF_UNIX)
+        listener.bind(server_path)
+        listener.listen(8)
+        listener.setblocking(False)
+    except OSError as e: print(f"error: server - {e}"); return None
+    root.tk.createfilehandler(listener, tk.READABLE, lambda *_: server_accept(listener))
+    return listener
+
+
+def server_accept(listener):
+    # the request is read on the executor so a slow or silent client never blocks the Tk thread.
+    try: conn, _ = listener.accept()
+    except OSError: return
+    executor.submit(server_read, conn, done=server_request)
+
+
+def server_read(conn):
+    try:
+        with conn:
+            conn.settimeout(2)
+            data = b""
+            while not data.endswith(b"\n") and (chunk := conn.recv(4096)): data += chunk
+            if not data: return None
+            args = json.loads(data)
+            conn.sendall(b"ok")
+            return args
+    except (OSError, ValueError) as e: print(f"error: server - {e}", file=sys.stderr)
+
+
+def server_request(args):
+    if args == None: return
+    path = next((a for a in args if not a.startswith("geo=")), "")
+    geo = next((ast.literal_eval(a[4:]) for a in args if a.startswith("geo=")), None)
+    window_open(path, geo)
+
+
 args = sys.argv[1:]
+executor.fork()
+startup_mark("fork")
 root = tk.Tk()
-
-for arg in args:
-    if arg.startswith("geo="):
-        x,y,width,height = ast.literal_eval(arg.replace("geo=", ""))
-        root.geometry('%dx%d+%d+%d' % (width, height, x, y))
-        break
-    
+startup_mark("tk")
 
 if os.name == "nt": root.title("")
 else: root.title("grampy")
 
 photo = tk.PhotoImage(data=_grampy_icon)
-root.wm_iconphoto(False, photo)
-root.configure(background=config["text"]["background"])
-
-root.bind("<Control-s>", lambda _: save_file(current_file))
-root.bind("<Control-m>", lambda _: file_open(conf_path))
-root.bind("<Control-p>", lambda _: show_stdout())
 
 cmd_register("open", lambda x: cmd_open(*x) , cmd_glob_matches, "<Control-o>")
 cmd_register("tab", lambda x: cmd_tab(*x), cmd_tab_matches, "<Control-t>")
@@ -966,102 +2230,254 @@ cmd_register("cache", lambda x: cmd_cache(*x), cmd_cache_matches, "<Control-k>")
 cmd_register("find", lambda x: find_text(editor, *x), shortcut="<Control-f>")
 cmd_register("find all", lambda x: find_all(x[0]), shortcut="<Control-j>")
 cmd_register("exec", lambda x: cmd_exec(x[0]), shortcut="<Control-e>")
-cmd_register("save as", lambda x: (save_file(x[0]), file_open(x[0])), cmd_open_matches, "<Control-S>")
-
-editor = EventText(root, wrap='none', undo=True)
-complist = tk.Listbox(root, relief='flat')
-
-complist.bind("<Configure>", lambda _: complist_configure())
-complist.bind("<Double-Button-1>", complist_insert)
-complist.bind("<Return>", complist_insert)
-complist.bind("<Tab>", complist_insert)
-complist.bind("<Escape>", lambda x: palette.focus_set())
-complist.bind("<Down>", lambda _: "")
-complist.bind("<Up>", lambda _: "")
-complist.bind("<Shift_L>", lambda _: "")
-complist.bind("<Shift_R>", lambda _: "")
-complist.bind("<Key>", lambda x: (palette.insert(tk.END, x.char), palette.focus_set()))
-complist.configure(borderwidth=0, selectborderwidth=0)
-complist.configure(activestyle='none')
-
-palette = tk.Entry(root)
+cmd_register("memory", lambda x: tab_memory())
+cmd_register("save as", lambda x: save_file(x[0], lambda: file_open(x[0])), cmd_open_matches, "<Control-S>")
+
 palette_cus = lambda x=None: complist_update_start(palette.get())
-palette.bind("<Control-a>", palette_select_all)
-palette.bind("<Configure>", lambda _: complist_configure())
-palette.bind("<Control-w>", lambda x: file_close(editor.path))
-palette.bind("<KeyRelease>", lambda x: palette_cus() if 31<x.keysym_num<200 else "")
-palette.bind("<KeyRelease-BackSpace>", palette_cus)
-palette.bind("<KeyRelease-Delete>", palette_cus)
-palette.bind('<FocusIn>', lambda x: palette.focus_set())
-palette.bind("<Control-BackSpace>", lambda x: (delete_to_break(palette), palette_cus()))
-palette.bind("<Control-Delete>", lambda x: (delete_to_break(palette, False), palette_cus()))
-palette.bind("<Escape>", lambda x: editor.focus_set())
-palette.bind("<Tab>", lambda x: complist_insert(None, 0))
-palette.bind("<Down>", lambda x: (complist.focus_set(), complist.select_set(0)) if complist.size() else "")
-palette.configure(borderwidth=0)
-palette.pack(fill="x")
-apply_config(editor)
-os.chdir(os.path.expanduser("~"))
-if args and os.path.exists(args[0]): file_open(args[0])
-else:
-    readme = os.path.join(os.path.dirname(__file__),"README.md")
-    if os.path.exists(readme): file_open(readme, read_only=True)
-    else:
-        new_file = "new_file.txt"
-        for i in range(0, 1000):
-            if not os.path.exists(new_file): break
-            new_file = f"new_file{i}.txt"
-        file_open(new_file)
+window_create(root, next((ast.literal_eval(a[4:]) for a in args if a.startswith("geo=")), None))
+startup_mark("window")
+def reload_file(widget):
+    ins = widget.index(tk.INSERT); end = widget.index(tk.END+" - 1c")
+    if widget.read_only:
+        data = open(widget.path, "rb").read()
+        tail_start(widget, 0, os.stat(widget.path).st_ino)
+        text = tail_decode(widget, data)
+        widget.configure(state=tk.NORMAL)
+    else: text = open(widget.path).read()
+    widget.delete("1.0", tk.END)
+    load_text(widget, text)
+    if widget.compare(ins, ">=", end): widget.mark_set(tk.INSERT, tk.END)
+    else: widget.mark_set(tk.INSERT, ins)
+    if widget.read_only or widget.loading: widget.configure(state=tk.DISABLED)
+    widget.see(tk.INSERT)
+    return True
+
+
+def load_text(widget, text):
+    widget.insert(tk.END, text[:load_head])
+    if len(text) > load_head: load_start(widget, text[load_head:], load_head, len(text))
+
+
+def load_start(widget, rest, loaded, size):
+    # the first screenful is already in the widget. the rest, a string or a file still to be read on the executor,
+    # is appended a frame budgeted chunk at a time by load_step. parsing and highlighting wait for load_finish.
+    widget.loading = [rest if isinstance(rest, str) else None, 0, loaded, size]
+    widget.configure(state=tk.DISABLED)
+    loading.append(widget)
+    if not isinstance(rest, str):
+        def read():
+            with rest: return rest.read(), rest.tell()
+        def ready(result):
+            if not widget.loading: return
+            widget.loading[0] = result[0] if result else ""
+            if result and widget.tail: tail_start(widget, result[1], widget.tail[0])
+        executor.submit(read, done=ready)
+    update_title(widget)
+
+
+def load_step(budget=0.008):
+    start = time.time()
+    for widget in list(loading):
+        if not widget.winfo_exists(): loading.remove(widget); continue
+        text, pos, loaded, size = widget.loading
+        while text != None and pos < len(text) and time.time()-start < budget:
+            chunk = text[pos:pos+load_head]
+            widget.configure(state=tk.NORMAL)
+            widget.insert(tk.END, chunk)
+            widget.configure(state=tk.DISABLED)
+            widget.edits = False
+            pos += len(chunk); loaded += len(chunk)
+            widget.loading[1:3] = pos, loaded
+        if text != None and pos >= len(text): load_finish(widget)
+        else: update_title(widget)
+
+
+def load_finish(widget):
+    loading.remove(widget)
+    widget.loading = None
+    if not widget.read_only: widget.configure(state=tk.NORMAL)
+    widget.edit_reset()
+    widget.edits = False
+    widget.edit_modified(False)
+    update_title(widget)
+    if widget == editor: update_tags(widget, True)
+    file_changed(widget)
+
+
+def is_large(path):
+    try: return os.path.getsize(path) > config.get("large_file", 64 << 20)
+    except OSError: return False
+
+
+def large_window(widget, line):
+    large = widget.large
+    large.start = max(0, min(line-large.window//2, large.line_count()-large.window))
+    widget.configure(state=tk.NORMAL)
+    widget.delete("1.0", tk.END)
+    widget.insert(tk.END, large.text(large.start, large.window))
+    widget.configure(state=tk.DISABLED)
+    widget.edit_reset()
+    update_title(widget)
+    return f"{line-large.start+1}.0"
+
+
+def large_scroll(widget):
+    # recentre the window once the view gets near either edge of it.
+    large = widget.large
+    top = widget.rowcol("@0,0")[0]
+    bottom = widget.rowcol(f"@0,{widget.winfo_height()}")[0]
+    rows = widget.rowcol("end - 1c")[0]+1
+    if (large.start > 0 and top < large.window//4) or (bottom > rows-large.window//4 and large.start+rows < large.line_count()):
+        row, col = widget.rowcol(tk.INSERT)
+        line, start = large.start+top, large.start
+        widget.yview(large_window(widget, line))
+        if 0 <= start+row-large.start < rows: widget.mark_set(tk.INSERT, f"{start+row-large.start+1}.{col}")
+
+
+def large_goto(widget, index):
+    # a line past the background indexer is indexed on the executor, the jump happens once it's reached.
+    line, col = map(int, str(index).split("."))
+    large = widget.large
+    def goto(_=None):
+        if not widget.winfo_exists() or widget.large is not large: return
+        widget.mark_set(tk.INSERT, large_window(widget, line-1)+f" + {col}c")
+        widget.see(tk.INSERT)
+    if large.done() or len(large.lines) > line+large.window+1: goto()
+    else: executor.submit(large.index_line, line+large.window, done=goto)
+
+
+def large_find(widget, text, backwards=False):
+    large = widget.large
+    row, col = widget.rowcol(tk.INSERT)
+    pos = large.lines[min(large.start+row, len(large.lines)-1)]+len(widget.get(f"{row+1}.0", tk.INSERT).encode())
+    if backwards: pos = max(0, pos-len(text.encode()))
+    def search():
+        offset = large.find(text, pos, backwards)
+        if offset != None: large.index_to(offset+1); large.index_line(large.line_of(offset)+large.window)
+        return offset
+    def found(offset):
+        if offset == None: return root.bell()
+        line = large.line_of(offset)
+        col = len(large.data[large.lines[line]:offset].decode(errors="replace"))
+        if not large.start <= line < large.start+large.window-1: large_window(widget, line)
+        pos = f"{line-large.start+1}.{col}"
+        widget.tag_remove(tk.SEL, "1.0", tk.END)
+        widget.tag_add(tk.SEL, pos, f"{pos}+{len(text)}c")
+        widget.mark_set(tk.INSERT, f"{pos}+{len(text)}c")
+        widget.mark_set("tk::anchor1", pos)
+        widget.see(tk.INSERT)
+    executor.submit(search, done=found)
+    return "break"
+
+
+def tail_start(widget, offset, inode):
+    widget.tail = (inode, offset, codecs.getincrementaldecoder("utf-8")(errors="replace"), "")
+
+
+def tail_decode(widget, data):
+    # a trailing "\r" is held back until the next read, in case its "\n" is the first byte there.
+    inode, offset, decoder, cr = widget.tail
+    text = cr+decoder.decode(data)
+    cr = "\r" if text.endswith("\r") else ""
+    widget.tail = (inode, offset+len(data), decoder, cr)
+    return text[:len(text)-len(cr)].replace("\r\n", "\n")
+
+
+def tail_file(widget):
+    if not widget.tail: return False
+    inode, offset = widget.tail[:2]
+    stat = os.stat(widget.path)
+    if stat.st_ino != inode or stat.st_size < offset: return False
+    with open(widget.path, "rb") as f: f.seek(offset); data = f.read()
+    text = tail_decode(widget, data)
+    if not text: return True
+    follow = widget.compare(tk.INSERT, ">=", "end - 1c")
+    widget.configure(state=tk.NORMAL)
+    widget.insert(tk.END, text)
+    widget.configure(state=tk.DISABLED)
+    if follow: widget.mark_set(tk.INSERT, tk.END); widget.see(tk.INSERT)
+    return True
+
+
+def file_changed(widget):
+    if widget.loading or widget.path in saving or not os.path.isfile(widget.path): return
+    mtime = os.path.getmtime(widget.path)
+    if mtime == widget.mtime: return
+    if widget.large:
+        line = widget.large.start+widget.rowcol("@0,0")[0]
+        widget.mtime = mtime
+        widget.large = LargeFile(widget.path)
+        widget.yview(large_window(widget, line))
+        return update_tags(widget, True)
+    if not widget.edits:
+        widget.mtime = mtime
+        if not (widget.read_only and tail_file(widget)) and reload_file(widget): update_tags(widget, True)
+        widget.edits = False
+        widget.extern_edits = False
+        update_title(widget)
+    elif not widget.extern_edits:
+        widget.extern_edits = True
+        if widget == editor: root.bell()
+        update_title(widget)
+
+
+def wake(delay=1):
+    global wake_id, wake_time
+    when = time.time()+delay/1000
+    if wake_id != None and wake_time <= when: return
+    if wake_id != None: root.after_cancel(wake_id)
+    wake_time, wake_id = when, root.after(delay, watch_file)
+
 
 def watch_file():
-    global conf_mtime
-    global frame_time
+    global frame_time, wake_id
+    wake_id = None
     frame_time = time.time()
-    do_update = False
-    update_time = 1
     try:
         sys.stdout.flush()
         if destroy_list: dest = destroy_list.pop(); dest.destroy()
         if editor.edits and not editor.edit_modified(): editor.edits = False; update_title(editor)
-        if editor.changes: update_tags(editor)
-        while editor.tag_queue and (time.time()-frame_time < 0.01): editor.tag_queue.pop(0)()
-
-        if os.path.isfile(editor.path):
-            mtime = os.path.getmtime(editor.path)
-            if mtime != editor.mtime:
-                if not editor.edits:
-                    editor.mtime = mtime
-                    ins = editor.index(tk.INSERT); end = editor.index(tk.END+" - 1c")
-                    if editor.read_only: editor.configure(state=tk.NORMAL)
-                    editor.delete("1.0", tk.END)
-                    editor.insert(tk.END, open(editor.path).read())
-                    if editor.compare(ins, ">=", end): editor.mark_set(tk.INSERT, tk.END)
-                    else: editor.mark_set(tk.INSERT, ins)
-                    if editor.read_only: editor.configure(state=tk.DISABLED)
-                    editor.see(tk.INSERT)
-                    editor.edits = False
-                    editor.extern_edits = False
-                    do_update = True
-                    update_title(editor)
-                elif not editor.extern_edits:
-                    editor.extern_edits = True
-                    root.bell()
-                    update_title(editor)
-        mtime = os.path.getmtime(conf_path)
-
-        if mtime != conf_mtime:
-            conf_mtime = mtime
-            apply_config(editor)
-            do_update = True
-        if do_update: update_tags(editor)
+        if editor.large: large_scroll(editor)
+        update_tags(editor)
+        find_drain()
+        load_step()
+        executor.dispatch()
+        while editor.tag_queue and (time.time()-frame_time < 0.01): editor.tag_queue.step(editor)
+
+        for path in watcher.poll([editor.path, conf_path]):
+            if path == conf_path:
+                apply_config(editor)
+                update_tags(editor, True)
+            if (key := file_to_key(path)) in files and not isinstance(files[key]["editor"], list): file_changed(files[key]["editor"])
     except Exception as e:
         print(e, file=sys.stderr)
-    root.after(update_time, watch_file)
+    if destroy_list or editor.tag_queue or editor.highlighter.results or executor.done or loading: wake(1)
+    elif editor.highlighter.busy or find_feed or highlight_pending(editor) or executor.busy(): wake(10)
+    elif watcher.fd == None or watcher.polled: wake(watcher.interval)
 
+apply_config(editor)
+startup_mark("config")
+os.chdir(os.path.expanduser("~"))
+file_open_default(args[0] if args else "")
+
+startup_mark("open")
+root.update()
+startup_mark("first paint")
+
+# everything below can wait until the first frame is up.
+threading.Thread(target=dir_index.warm, args=[os.curdir, config.get("index_limit", 50000)], name="dir_index", daemon=True).start()
+if watcher.fd != None: root.tk.createfilehandler(watcher.fd, tk.READABLE, lambda *_: (watcher.read(), wake()))
+server = server_start()
 watch_file()
+startup_mark("background")
+if profile_startup: startup_report()
 root.mainloop()
 
+if server: server.close(); os.remove(server_path)
+watcher.close()
+
 sys.stdout = sys.__stdout__
+trigram_index.save()
 for file in os.listdir(_sess_dir):
     key = file_to_key("/".join((_sess_dir, file)))
     if key in files: files.pop(key)
@@ -0,0 +1,345 @@
+import ast, glob, os, sys, random, struct, threading, tempfile, unittest
+gram_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gram.py")
+
+
+def load(*names, **extra):
+    # gram.py builds its window at import, so only the imports and the named top level defs/assignments are run.
+    tree = ast.parse(open(gram_path).read())
+    def named(node):
+        if isinstance(node, (ast.Import, ast.ImportFrom)): return True
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)): return node.name in names
+        if isinstance(node, ast.Assign): return any(n.id in names for t in node.targets for n in ast.walk(t) if isinstance(n, ast.Name))
+        return False
+    body = [node for node in tree.body if named(node)]
+    ns = {"__name__": "gram_part", "startup_marks": [], **extra}
+    exec(compile(ast.Module(body=body, type_ignores=[]), gram_path, "exec"), ns)
+    return ns
+
+
+def text_offset(text, row, col):
+    lines = text.split("\n")
+    if row >= len(lines): row = len(lines)-1; col = sys.maxsize
+    return sum(len(line)+1 for line in lines[:row])+max(0, min(col, len(lines[row])))
+
+
+class DocumentTest(unittest.TestCase):
+    def setUp(self):
+        self.Document = type("Document", (load("Document")["Document"],), {"block_size": 4})
+
+    def check(self, doc, text):
+        self.assertEqual(doc.text, text)
+        self.assertEqual(list(doc.lines()), text.splitlines(True)+([""] if text.endswith("\n") or not text else []))
+        self.assertEqual(doc.line_count(), text.count("\n")+1)
+        self.assertEqual(doc.rows, [sum(map(len, doc.blocks[:i+1])) for i in range(len(doc.blocks))])
+        for row, line in enumerate(text.split("\n")): self.assertEqual(doc.line(row).rstrip("\n"), line)
+
+    def test_random_splices(self):
+        rand = random.Random(1)
+        for _ in range(20):
+            text = "".join(rand.choice("ab\n") for _ in range(rand.randrange(200)))
+            doc = self.Document(text)
+            self.check(doc, text)
+            for _ in range(100):
+                rows = text.count("\n")+2
+                row1, row2 = sorted((rand.randrange(rows), rand.randrange(rows)))
+                col1, col2 = rand.randrange(6), rand.randrange(6)
+                insert = "".join(rand.choice("xy\n") for _ in range(rand.choice((0, 1, 3, 40))))
+                start, end = text_offset(text, row1, col1), text_offset(text, row2, col2)
+                text = text[:start]+insert+text[max(start, end):]
+                doc.splice(row1, col1, row2, col2, insert)
+                self.check(doc, text)
+
+    def test_offsets(self):
+        rand = random.Random(2)
+        text = "".join(rand.choice("ab\u00e9\u4e2d\n") for _ in range(300))
+        doc = self.Document(text)
+        doc.splice(3, 0, 3, 0, "x\ny\n"); text = doc.text
+        self.assertEqual(doc.position(len(text)), (text.count("\n"), len(text)-text.rfind("\n")-1))
+        for use_bytes in (False, True):
+            data = text.encode() if use_bytes else text
+            for offset in range(len(data)+1):
+                if use_bytes and offset < len(data) and data[offset] & 0xc0 == 0x80: continue
+                head = data[:offset].decode() if use_bytes else data[:offset]
+                row, col = head.count("\n"), len(head)-head.rfind("\n")-1
+                self.assertEqual(doc.position(offset, use_bytes), (row, col))
+                self.assertEqual(doc.index(offset, use_bytes), f"{row+1}.{col}")
+                self.assertEqual(doc.offset(row, col)[use_bytes], offset)
+
+    def test_splice_keeps_block_count(self):
+        doc = self.Document("\n".join(map(str, range(30))))
+        doc.line_count()
+        doc.blocks[1:4] = [["a\n"]*7, ["b\n"], ["c\n"]]
+        doc.rows = None; doc.line_count()
+        doc.splice(4, 0, 12, 0, "z\n"*8)
+        self.check(doc, "".join(doc.lines()))
+
+
+class TrigramTest(unittest.TestCase):
+    def setUp(self):
+        self.gram = load("TrigramIndex", "trigrams", "regex_trigrams")
+
+    def test_regex_trigrams(self):
+        trigrams, regex_trigrams = self.gram["trigrams"], self.gram["regex_trigrams"]
+        self.assertEqual(regex_trigrams("Hello.*world"), trigrams(b"hello") | trigrams(b"world"))
+        self.assertEqual(regex_trigrams("x(abcd)y"), trigrams(b"abcd"))
+        self.assertEqual(regex_trigrams("ab|cd"), set())
+        self.assertEqual(regex_trigrams("("), set())
+
+    def test_index(self):
+        TrigramIndex, trigrams = self.gram["TrigramIndex"], self.gram["trigrams"]
+        with tempfile.TemporaryDirectory() as dir:
+            paths = [os.path.join(dir, f"{i}.txt") for i in range(4)]
+            for path in paths: open(path, "w").write(path)
+            index = TrigramIndex(os.path.join(dir, "trigrams.idx")); index.load()
+            for i, path in enumerate(paths): index.update(path, 1, trigrams(b"common " + (b"odd" if i % 2 else b"even")))
+            self.assertEqual(index.candidates(trigrams(b"common")), set(paths))
+            self.assertEqual(index.candidates(trigrams(b"even")), {paths[0], paths[2]})
+            self.assertEqual(index.candidates(set()), None)
+            self.assertTrue(index.stale(paths[0], 2))
+            self.assertFalse(index.stale(paths[0], 1))
+            index.update(paths[0], 2, trigrams(b"common odd"))
+            os.remove(paths[2]); os.remove(paths[3])
+            index.save()
+            self.assertEqual(sorted(index.paths), [paths[0], paths[1]])
+            self.assertEqual(index.dead, 0)
+            self.assertEqual(sorted(os.listdir(dir)), ["0.txt", "1.txt", "trigrams.idx"])
+            loaded = TrigramIndex(index.path); loaded.load()
+            self.assertEqual(loaded.candidates(trigrams(b"odd")), {paths[0], paths[1]})
+            self.assertEqual(loaded.candidates(trigrams(b"even")), set())
+            self.assertEqual(loaded.files[paths[0]][1], 2)
+
+
+class WatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.FileWatcher = load("FileWatcher")["FileWatcher"]
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "a.txt")
+        open(self.path, "w").write("a")
+
+    def tearDown(self): self.dir.cleanup()
+
+    def touch(self, mtime):
+        os.utime(self.path, (mtime, mtime))
+
+    def test_inotify(self):
+        watcher = self.FileWatcher()
+        if watcher.fd == None: self.skipTest("no inotify")
+        watcher.add(self.path)
+        open(self.path, "w").write("b"); self.touch(1)
+        watcher.read()
+        self.assertEqual(watcher.poll(), [self.path])
+        watcher.close()
+        self.assertEqual(watcher.fd, None)
+
+    def test_failed_watch_is_polled(self):
+        watcher = self.FileWatcher()
+        if watcher.fd == None: self.skipTest("no inotify")
+        class Libc:
+            def inotify_add_watch(self, fd, dir, mask): return -1
+        libc, watcher.libc = watcher.libc, Libc()
+        watcher.add(self.path)
+        self.assertEqual(watcher.polled, {os.path.dirname(self.path)})
+        self.touch(1)
+        self.assertEqual(watcher.poll(), [self.path])
+        watcher.libc = libc; watcher.close()
+
+    def test_overflow_rechecks_all(self):
+        watcher = self.FileWatcher()
+        if watcher.fd == None: self.skipTest("no inotify")
+        watcher.add(self.path, 0)
+        read, write = os.pipe()
+        os.close(watcher.fd); watcher.fd = read
+        os.write(write, struct.pack("iIII", -1, 0x4000, 0, 0))
+        watcher.read()
+        self.assertEqual(watcher.poll(), [self.path])
+        os.close(read); os.close(write)
+
+
+class ExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.woken = []
+        self.executor = load("Executor", is_main_thread=lambda: True, wake=lambda: self.woken.append(1))["Executor"](workers=4)
+
+    def drain(self):
+        while self.executor.busy(): self.executor.dispatch()
+
+    def test_map(self):
+        results, finished = [], []
+        self.executor.map(lambda chunk: [x*2 for x in chunk], list(range(100)), done=results.extend, finished=lambda: finished.append(1))
+        self.drain()
+        self.assertEqual(sorted(results), [x*2 for x in range(100)])
+        self.assertEqual(finished, [1])
+
+    def test_error_without_done(self):
+        import contextlib, io
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+            self.executor.submit(lambda: 1/0).exception()
+            self.drain()
+        self.assertIn("ZeroDivisionError", err.getvalue())
+
+    def test_map_empty(self):
+        finished = []
+        self.executor.map(len, [], finished=lambda: finished.append(1))
+        self.assertTrue(self.woken)
+        self.drain()
+        self.assertEqual(finished, [1])
+
+
+class DirIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = load("DirIndex")["DirIndex"]()
+        self.tmp = tempfile.TemporaryDirectory(); self.dir = self.tmp.name
+        for path in ("a.py", "b.txt", ".hidden.py", "sub/c.py", "sub/deep/d.py", "sub/deep/e.txt", "other/f.py", ".git/g.py"):
+            path = os.path.join(self.dir, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True); open(path, "w").close()
+
+    def tearDown(self): self.tmp.cleanup()
+
+    def test_glob_matches_stdlib(self):
+        for pattern in ("*.py", "**/*.py", "sub/*", "*/deep/*.py", "sub/c.py", "sub/missing.py", "s*/d*/?.txt", ".*"):
+            pattern = os.path.join(self.dir, pattern)
+            self.assertEqual(sorted(self.index.glob(pattern)), sorted(glob.glob(pattern, recursive=True)), pattern)
+
+    def test_listing_revalidates(self):
+        self.assertEqual(self.index.listing(self.dir), ((".git", True), (".hidden.py", False), ("a.py", False), ("b.txt", False), ("other", True), ("sub", True)))
+        open(os.path.join(self.dir, "new.py"), "w").close()
+        os.utime(self.dir, (1, 1))
+        self.assertIn(("new.py", False), self.index.listing(self.dir))
+        self.assertEqual(self.index.listing(os.path.join(self.dir, "missing")), ())
+
+
+class FuzzyTest(unittest.TestCase):
+    candidates = ["src/gram.py", "src/grammar.json", "README.md", "tests/test_gram.py", "src/ag_ram.py", "GramPy.txt", "xgxrxaxm", "docs/g/r/a/m"]
+
+    def setUp(self): self.FuzzyMatcher = load("FuzzyMatcher")["FuzzyMatcher"]
+
+    def subsequence(self, query, candidate):
+        it = iter(candidate if any(c.isupper() for c in query) else candidate.lower())
+        return all(c in it for c in query)
+
+    def test_matches_subsequences(self):
+        matcher = self.FuzzyMatcher()
+        for query in ("g", "gr", "gram", "gramp", "grampy", "g", "GP", "gP", "zz", "md"):
+            expected = {c for c in self.candidates if self.subsequence(query, c)}
+            self.assertEqual(set(matcher.match(query, self.candidates)), expected, query)
+            self.assertEqual(matcher.match(query, self.candidates), self.FuzzyMatcher().match(query, self.candidates), query)
+
+    def test_ranking(self):
+        ranked = self.FuzzyMatcher().match("gram", self.candidates)
+        self.assertEqual(ranked[:2], ["GramPy.txt", "src/gram.py"])
+        self.assertEqual(ranked[-1], "xgxrxaxm")
+        self.assertEqual(self.FuzzyMatcher().match("gram", self.candidates, limit=2), ranked[:2])
+
+    def test_offset_and_cancel(self):
+        matcher = self.FuzzyMatcher()
+        self.assertEqual(matcher.match("", self.candidates, limit=3), self.candidates[:3])
+        self.assertEqual(matcher.match("gram", self.candidates, offset=4), ["src/gram.py", "src/grammar.json", "tests/test_gram.py", "src/ag_ram.py", "docs/g/r/a/m"])
+        self.assertEqual(matcher.match("gram", self.candidates, cancelled=lambda: True), None)
+
+
+class GrammarsTest(unittest.TestCase):
+    def test_unknown_extension_is_one_stat(self):
+        import json
+        with tempfile.TemporaryDirectory() as dir:
+            search, built = dir+"/github/", []
+            os.makedirs(search+"tree-sitter-python")
+            registry = {"search_path": search, "dir_mtime": 1.0, "mtimes": {"tree-sitter-python": os.path.getmtime(search+"tree-sitter-python")}, "extensions": {"py": "python"}, "highlights": {"python": []}}
+            json.dump(registry, open(dir+"/grammars.json", "w")); open(dir+"/treesitter.dll", "w").close()
+            def build_grammars(path, mtimes):
+                built.append(sorted(mtimes))
+                return {**registry, "dir_mtime": os.stat(path).st_mtime, "mtimes": mtimes, "extensions": {"py": "python", "rs": "rust"}}
+            gram = load("get_grammars", "grammar_lock", "grammars", build_grammars=build_grammars, grammars_path=dir+"/grammars.json", sitter_dll=dir+"/treesitter.dll", config={"tree-sitter": {"search_path": search}})
+            os.makedirs(search+"tree-sitter-rust"); os.utime(search, (1, 1))
+            self.assertEqual(gram["get_grammars"]("txt"), None)
+            self.assertEqual(gram["get_grammars"]("rs"), None)
+            self.assertEqual(built, [])
+            os.utime(search, (2, 2))
+            self.assertEqual(gram["get_grammars"]("rs")["extensions"]["rs"], "rust")
+            self.assertEqual(built, [["tree-sitter-python", "tree-sitter-rust"]])
+            self.assertEqual(gram["get_grammars"]("txt"), None)
+            self.assertEqual(len(built), 1)
+
+
+class WorkersTest(unittest.TestCase):
+    def test_workers(self):
+        import signal, socket
+        gram = load("Workers", "message_send", "message_recv", "workers_helper", "worker_serve")
+        exec("def pid(): return os.getpid()\ndef fail(): raise ValueError('fail')", gram)
+        control, helper = socket.socketpair()
+        if os.fork() == 0: control.close(); gram["workers_helper"](helper)
+        helper.close()
+        workers = gram["Workers"](control, 2)
+        try:
+            pid = workers.submit(gram["pid"]).result()
+            self.assertNotEqual(pid, os.getpid())
+            self.assertRaises(ValueError, workers.submit(gram["fail"]).result)
+            os.kill(pid, signal.SIGKILL)
+            self.assertRaises(ChildProcessError, workers.submit(gram["pid"]).result)
+            self.assertNotIn(workers.submit(gram["pid"]).result(), (pid, os.getpid()))
+        finally: control.close()
+
+
+class Executor:
+    def submit(self, fn, *args, done=None):
+        thread = threading.Thread(target=fn, args=args); thread.start()
+        return thread
+
+
+class LargeFileTest(unittest.TestCase):
+    def test_index_on_demand(self):
+        LargeFile = type("LargeFile", (load("LargeFile", executor=Executor())["LargeFile"],), {"chunk": 1 << 10})
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, "large.txt")
+            text = "".join(f"line {i}\n" for i in range(50000))
+            open(path, "w").write(text)
+            large = LargeFile(path)
+            large.index_line(40000)
+            self.assertEqual(large.text(40000, 2), "line 40000\nline 40001\n")
+            large.index_to(large.size)
+            self.assertEqual(list(large.lines), [0]+[m+1 for m, c in enumerate(text.encode()) if c == 10])
+            self.assertEqual(large.line_count(), 50000)
+
+
+class TailTest(unittest.TestCase):
+    def test_split_crlf(self):
+        tail_decode = load("tail_decode")["tail_decode"]
+        widget = type("Widget", (), {})()
+        widget.tail = (1, 0, load()["codecs"].getincrementaldecoder("utf-8")(errors="replace"), "")
+        data = "a\r\nb\u00e9\r\nc\r\n".encode()
+        text = "".join(tail_decode(widget, data[i:i+1]) for i in range(len(data)))
+        self.assertEqual(text, "a\nb\u00e9\nc\n")
+        self.assertEqual(widget.tail[1], len(data))
+
+
+class Watcher:
+    def add(self, path): pass
+
+
+class FilesTest(unittest.TestCase):
+    def test_mru_order(self):
+        gram = load("file_get", "file_to_key", "file_create", "file_text", "pack_text", "is_large", "files", "load_head", "file_lock", "gui_lock", config={}, watcher=Watcher())
+        gram["is_main_thread"] = lambda: False
+        with tempfile.TemporaryDirectory() as dir:
+            a, b = os.path.join(dir, "a.txt"), os.path.join(dir, "b.txt")
+            for path in (a, b): open(path, "w").write(path)
+            gram["file_get"](a); gram["file_get"](b)
+            self.assertEqual([f["path"] for f in gram["files"].values()], [b, a])
+            self.assertEqual(gram["file_get"](a)["path"], a)
+            self.assertEqual([f["path"] for f in gram["files"].values()], [a, b])
+
+
+class SaveTest(unittest.TestCase):
+    def test_write_through_symlink(self):
+        write_file = load("write_file")["write_file"]
+        with tempfile.TemporaryDirectory() as dir:
+            target, link = os.path.join(dir, "target.sh"), os.path.join(dir, "link.sh")
+            open(target, "w").write("old")
+            os.chmod(target, 0o751); os.symlink(target, link)
+            write_file(link, "new")
+            self.assertTrue(os.path.islink(link))
+            self.assertEqual(open(target).read(), "new")
+            self.assertEqual(os.stat(target).st_mode & 0o777, 0o751)
+            self.assertEqual(sorted(os.listdir(dir)), ["link.sh", "target.sh"])
+
+
+if __name__ == "__main__": unittest.main()